@@ -0,0 +1,53 @@
+"""
+Compares the requests per second of one-off connections against the
+pooled, keep-alive connections of PlatformClient.
+
+Run it with the same server, email and password as the examples.
+"""
+import concurrent.futures
+import time
+from urllib.parse import urljoin
+
+import requests
+
+from blueno import PlatformClient
+
+API_SERVER = ''
+EMAIL = ''
+PASSWORD = ''
+NUM_REQUESTS = 1000
+NUM_THREADS = 8
+
+
+def _benchmark(name, request_fn):
+    start = time.time()
+    with concurrent.futures.ThreadPoolExecutor(NUM_THREADS) as executor:
+        for res in executor.map(lambda _: request_fn(),
+                                range(NUM_REQUESTS)):
+            res.raise_for_status()
+    end = time.time()
+    print(f'{name}: {NUM_REQUESTS / (end - start):.1f} requests/second'
+          f' ({NUM_THREADS} threads)', flush=True)
+
+
+def benchmark():
+    client = PlatformClient(API_SERVER, EMAIL, PASSWORD,
+                            pool_size=NUM_THREADS)
+    url = urljoin(API_SERVER, '/datasets/')
+    # Reuse the token of the client so both cases make the same request
+    res = client._request('get', url)
+    headers = {
+        'Authorization': res.request.headers['Authorization'],
+    }
+
+    # Before: a new TCP (and TLS) connection per request
+    _benchmark('requests.request',
+               lambda: requests.request('get', url, headers=headers))
+    # After: connections are kept alive in the client's pool
+    _benchmark('PlatformClient._request',
+               lambda: client._request('get', url))
+    client.close()
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -1,6 +1,9 @@
+import asyncio
+import io
+
 import pytest
 
-from blueno import PlatformClient, PlatformError
+from blueno import AsyncPlatformClient, PlatformClient, PlatformError
 
 # TODO: YOUR SERVER HERE (ex. 'https://example.com' or 'http://35.35.35.35')
 API_SERVER = ''
@@ -64,7 +67,7 @@ def test_crud_samples(client: PlatformClient):
         data_url='file://test/crud_samples/no-data.xzx',
         validate=False,
         split='training')
-    assert len(client.list_samples(dataset)) == 1
+    assert len(list(client.list_samples(dataset))) == 1
     # 2nd attempt to create w/ sample name should fail
     assert not client.register_sample(
         samples[0],
@@ -72,7 +75,7 @@ def test_crud_samples(client: PlatformClient):
         data_url='file://test/crud_samples/no-data.xzx',
         validate=False,
         split='test')
-    listed_samples = client.list_samples(dataset)
+    listed_samples = list(client.list_samples(dataset))
     assert len(listed_samples) == 1
     # 2nd attempt to create w/ sample name should not change 'info'
     assert listed_samples[0]['info']['split'] == 'training'
@@ -84,13 +87,13 @@ def test_crud_samples(client: PlatformClient):
         data_url='file://test/crud_samples/with-data.txt',
         validate=False,
         split='training')
-    listed_samples = client.list_samples(dataset)
+    listed_samples = list(client.list_samples(dataset))
     assert len(listed_samples) == 2
 
     # # Basic cleanup should work
     client.delete_sample(samples[0], dataset)
     client.delete_sample(samples[1], dataset)
-    assert len(client.list_samples(dataset)) == 0
+    assert len(list(client.list_samples(dataset))) == 0
 
     client.delete_dataset(dataset)
 
@@ -106,4 +109,95 @@ def test_register_sample_validate(client: PlatformClient):
             data_url='gs://elvo-platform/test/register_validate/no-data.xzx',
             validate=True,
             split='training')
-    assert len(client.list_samples(dataset)) == 0
+    assert len(list(client.list_samples(dataset))) == 0
+
+
+def test_register_samples(client: PlatformClient):
+    dataset = 'blueno::test_register_samples'
+
+    client.create_dataset(dataset)
+    samples = ({
+        'name': f'sample{i}',
+        'data_url': f'file://test/register_samples/{i}.xzx',
+        'split': 'training',
+    } for i in range(5))
+    statuses = client.register_samples(dataset, samples,
+                                       validate=False, batch_size=2)
+    assert [s['status'] for s in statuses] == ['created'] * 5
+    # Pages should be followed until all samples are listed
+    assert len(list(client.list_samples(dataset, page_size=2))) == 5
+
+    # Registering the samples again should conflict
+    statuses = client.register_samples(
+        dataset,
+        [{
+            'name': 'sample0',
+            'data_url': 'file://test/register_samples/0.xzx',
+        }],
+        validate=False)
+    assert statuses[0]['status'] == 'conflict'
+
+    for i in range(5):
+        client.delete_sample(f'sample{i}', dataset)
+    client.delete_dataset(dataset)
+
+
+def test_async_crud_samples(client: PlatformClient):
+    dataset = 'blueno::test_async_crud_samples'
+
+    async def crud_samples():
+        async with AsyncPlatformClient(API_SERVER, EMAIL, PASSWORD,
+                                       max_in_flight=2) as async_client:
+            assert await async_client.create_dataset(dataset)
+            created = await asyncio.gather(*[
+                async_client.register_sample(
+                    f'sample{i}', dataset,
+                    data_url=f'file://test/async_crud_samples/{i}.xzx',
+                    validate=False)
+                for i in range(5)
+            ])
+            assert created == [True] * 5
+            listed_samples = [
+                s async for s in async_client.list_samples(dataset)]
+            assert len(listed_samples) == 5
+            deleted = await asyncio.gather(*[
+                async_client.delete_sample(f'sample{i}', dataset)
+                for i in range(5)
+            ])
+            assert deleted == [True] * 5
+            assert await async_client.delete_dataset(dataset)
+
+    asyncio.get_event_loop().run_until_complete(crud_samples())
+    assert dataset not in {d['name'] for d in client.list_datasets()}
+
+
+def test_stream_samples(client: PlatformClient):
+    dataset = 'blueno::test_stream_samples'
+
+    client.create_dataset(dataset)
+    client.register_samples(dataset, [{
+        'name': f'sample{i}',
+        'data_url': f'file://test/stream_samples/{i}.xzx',
+        'split': 'training' if i < 3 else 'test',
+    } for i in range(5)], validate=False)
+
+    streamed = list(client.stream_samples(dataset))
+    assert [s['name'] for s in streamed] == [f'sample{i}' for i in range(5)]
+    assert len(list(client.stream_samples(dataset, split='test'))) == 2
+    assert next(client.stream_samples(dataset, fields=['name'])) == {
+        'name': 'sample0',
+    }
+
+    for i in range(5):
+        client.delete_sample(f'sample{i}', dataset)
+    client.delete_dataset(dataset)
+
+
+def test_download_sample_range(client: PlatformClient):
+    data_url = 'file://test/download_sample_range/data.txt'
+    client.upload_sample(data_url, io.BytesIO(b'0123456789'))
+
+    assert client.download_sample(data_url).read() == b'0123456789'
+    assert client.download_sample(data_url, 2, 5).read() == b'234'
+    assert client.download_sample(data_url, start=7).read() == b'789'
+    assert client.download_sample(data_url, end=2).read() == b'01'
@@ -108,17 +108,19 @@ def _load_individual(client, filename, split_class):
 
 
 def load_individual():
-    client = PlatformClient(API_SERVER, EMAIL, PASSWORD)
-    client.create_dataset(
-        DATASET_INDIVIDUAL,
-        description="Individual CIFAR-10 numpy arrays",
-    )
-
     training_files = ['data_batch_1', 'data_batch_2', 'data_batch_3',
                       'data_batch_4',
                       'data_batch_5']
     test_files = ['test_batch']
 
+    # The client is shared by the threads so keep a connection per thread
+    client = PlatformClient(API_SERVER, EMAIL, PASSWORD,
+                            pool_size=len(training_files) + len(test_files))
+    client.create_dataset(
+        DATASET_INDIVIDUAL,
+        description="Individual CIFAR-10 numpy arrays",
+    )
+
     threads = []
     for filename in training_files:
         t = threading.Thread(
@@ -1,11 +1,23 @@
 # TODO: Keep client/blueno.py cluster/register/blueno.py. In the future,
 #  more should be done to version this file properly.
+import asyncio
 import io
+import itertools
+import json
+import threading
 import time
-from typing import Dict, Any, List, BinaryIO
+from typing import (Dict, Any, List, BinaryIO, Iterable, Iterator, Union,
+                    AsyncIterable, AsyncIterator, Awaitable, Callable,
+                    Optional)
 from urllib.parse import urljoin
 
 import requests
+import requests.adapters
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None  # AsyncPlatformClient is not available
 
 
 class PlatformError(Exception):
@@ -21,23 +33,54 @@ class PlatformClient(object):
     def __init__(self,
                  server: str,
                  email: str,
-                 password: str):
+                 password: str,
+                 pool_size: int = 10):
+        """
+        :param server: the URL of the server (ex. http://35.35.35.35)
+        :param email: the email of a registered user
+        :param password: the password of the user
+        :param pool_size: the number of keep-alive connections to the server
+            to reuse. Set this to the number of threads sharing the client.
+        """
         self.server = server
         self.email = email
         self.__password = password
+        # Sessions reuse TCP/TLS connections across requests. The adapter's
+        # connection pool is thread-safe so the client can be shared
+        # between threads. A pool is kept per host, so that the connections
+        # to the server are not closed by direct uploads to GCS or Azure.
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=10,
+                                                pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._token_lock = threading.Lock()
         self.__access_token = self.__updated_access_token()
 
-    def list_datasets(self) -> List[Dict]:
+    def close(self):
+        """
+        Closes the pooled connections of the client.
+        """
+        self._session.close()
+
+    def list_datasets(self, fields: List[str] = None) -> List[Dict]:
         """
         Lists all datasets available to the team.
 
+        :param fields: only return these fields of each dataset
+            (ex. ['name', 'info.description']). All fields are returned
+            by default.
         :return: a list of Python dictionaries with
             the names of the datasets and other dataset metadata available.
         :raises PlatformError: if the action fails
         """
+        params = {}
+        if fields:
+            params['fields'] = ','.join(fields)
         res = self._request(
             'get',
             urljoin(self.server, '/datasets/'),
+            params=params,
         )
         return res.json()['datasets']
 
@@ -104,24 +147,90 @@ class PlatformClient(object):
             f"Failed to delete dataset {name}"
             f" (CODE={res.status_code} DATA={res.text})")
 
-    def list_samples(self, dataset: str) -> List[Dict]:
+    def list_samples(self,
+                     dataset: str,
+                     page_size: int = 1000,
+                     fields: List[str] = None) -> Iterator[Dict]:
+        """
+        Lazily lists the samples in the dataset, page_size samples
+        per request.
+
+        :param dataset: the name of a datset.
+        :param page_size: the number of samples fetched per request
+        :param fields: only return these fields of each sample
+            (ex. ['name', 'info.label']). All fields are returned
+            by default.
+        :return: an iterator of dictionaries containing the names of the
+            samples and additional metadata.
+        :raises PlatformError: if an unexpect failure occurs
+        """
+        cursor = None
+        while True:
+            params = {'limit': page_size}
+            if fields:
+                params['fields'] = ','.join(fields)
+            if cursor:
+                params['cursor'] = cursor
+            res = self._request(
+                'get',
+                urljoin(self.server, f'/datasets/{dataset}/samples/'),
+                params=params,
+            )
+            if res.status_code != 200:
+                raise PlatformError(
+                    f"Could not list samples"
+                    f" (CODE={res.status_code} DATA={res.text})")
+            page = res.json()
+            yield from page['samples']
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+
+    def stream_samples(self,
+                       dataset: str,
+                       label: Any = None,
+                       split: str = None,
+                       fields: List[str] = None) -> Iterator[Dict]:
         """
-        Lists the samples in the dataset.
+        Streams all samples in the dataset in a single request.
+
+        The server sends the samples as they are read from the
+        database, so neither side holds the whole listing in memory.
 
         :param dataset: the name of a datset.
-        :return: a list of dictionaries containing the names of the
+        :param label: only stream samples with this label
+        :param split: only stream samples in this split
+        :param fields: only return these fields of each sample
+            (ex. ['name', 'info.label']). All fields are returned
+            by default.
+        :return: an iterator of dictionaries containing the names of the
             samples and additional metadata.
         :raises PlatformError: if an unexpect failure occurs
         """
+        params = {}
+        if fields:
+            params['fields'] = ','.join(fields)
+        if label is not None:
+            params['label'] = label
+        if split is not None:
+            params['split'] = split
         res = self._request(
             'get',
             urljoin(self.server, f'/datasets/{dataset}/samples/'),
+            params=params,
+            headers={
+                'Accept': 'application/x-ndjson',
+            },
+            stream=True,
         )
-        if res.status_code == 200:
-            return res.json()['samples']
-        raise PlatformError(
-            f"Could not list samples"
-            f" (CODE={res.status_code} DATA={res.text})")
+        if res.status_code != 200:
+            raise PlatformError(
+                f"Could not stream samples"
+                f" (CODE={res.status_code} DATA={res.text})")
+        with res:
+            for line in res.iter_lines():
+                if line:
+                    yield json.loads(line)
 
     def create_sample(self,
                       name: str,
@@ -198,21 +307,11 @@ class PlatformClient(object):
         :raises PlatformError: if an internal server error occurs
         """
         # 1. Prepare the payload options
-        if other_info is None:
-            info = {}
-        else:
-            info = other_info.copy()
-        if data_url:
-            info['data'] = {
-                'url': data_url
-            }
-        if image_type:
-            info['image'] = {
-                'type': image_type,
-            }
-        info['label'] = label
-        info['split'] = split
-
+        info = self._sample_info(data_url,
+                                 image_type=image_type,
+                                 label=label,
+                                 split=split,
+                                 other_info=other_info)
         payload = {
             'validate': validate,
             'info': info,
@@ -233,23 +332,108 @@ class PlatformClient(object):
             f"Failed to create sample {name} in {dataset}"
             f" (CODE={res.status_code} DATA={res.text})")
 
-    def upload_sample(self, data_url: str, data_content: BinaryIO):
+    def register_samples(self,
+                         dataset: str,
+                         samples: Iterable[Dict[str, Any]],
+                         validate: bool = True,
+                         batch_size: int = 1000) -> List[Dict]:
+        """
+        Registers many samples in the platform, batch_size samples
+        per request.
+
+        This is much faster than calling register_sample() for each sample.
+        The samples iterable is consumed lazily so it can be a generator.
+
+        :param dataset: the name of the dataset to register the samples in
+        :param samples: dictionaries with the keyword arguments of
+            register_sample() (name, data_url, image_type, label, split,
+            other_info)
+        :param validate: if True, checks to see whether the
+            data exists at each data_url
+        :param batch_size: the number of samples registered per request.
+            The server accepts at most 10000 samples per request.
+        :return: a status dictionary for each sample, in order. The
+            'status' of each sample is 'created', 'conflict' (a sample with
+            the same name already exists) or 'invalid' (see 'message').
+        :raises PlatformError: if a batch fails for another reason
+        """
+        statuses = []
+        iterator = iter(samples)
+        while True:
+            batch = list(itertools.islice(iterator, batch_size))
+            if not batch:
+                break
+            payload = {
+                'validate': validate,
+                'samples': [
+                    {
+                        'name': s['name'],
+                        'info': self._sample_info(
+                            s['data_url'],
+                            image_type=s.get('image_type'),
+                            label=s.get('label'),
+                            split=s.get('split'),
+                            other_info=s.get('other_info')),
+                    }
+                    for s in batch
+                ],
+            }
+            res = self._request(
+                'post',
+                urljoin(self.server, f'/datasets/{dataset}/samples/'),
+                json=payload,
+            )
+            if res.status_code != 200:
+                raise PlatformError(
+                    f"Failed to register samples in {dataset}"
+                    f" (CODE={res.status_code} DATA={res.text})")
+            statuses.extend(res.json()['samples'])
+        return statuses
+
+    def upload_sample(self,
+                      data_url: str,
+                      data_content: BinaryIO,
+                      direct: bool = True):
         """
         Uploads the file content to the data url.
 
+        Data in GCS and Azure is uploaded straight to the bucket with a
+        signed URL from the server, unless direct is False or the data is
+        larger than a single upload request allows (256 MiB for Azure).
+
         :param data_url: the internal url of the sample
         :param data_content: a file-like object
+        :param direct: whether to upload cloud data without going
+            through the server
         :raises PlatformError: if the upload fails
         """
-        files = {
-            'file': (data_url, data_content),
-        }
-        url = urljoin(self.server, '/data/upload')
-        res = self._request('post', url,
+        if direct and data_url.startswith(_DIRECT_UPLOAD_PREFIXES):
+            upload = self._signed_upload(data_url)
+            # Data too large for one request is uploaded through the server
+            if _fits_upload(upload, _content_size(data_content)):
+                # The signature is the authorization, so this is sent
+                # without the access token of _request()
+                res = self._session.request(upload['method'],
+                                            upload['url'],
+                                            headers=upload['headers'],
+                                            data=data_content)
+                if not res.ok:
+                    raise PlatformError(
+                        f"Failed to upload data {data_url}"
+                        f" (CODE={res.status_code} DATA={res.text})")
+                return
+
+        # The raw body is streamed to the store by the server, unlike
+        # the multipart form of /data/upload
+        url = urljoin(self.server, '/data/objects')
+        res = self._request('put', url,
                             params={
                                 'url': data_url,
                             },
-                            files=files)
+                            headers={
+                                'Content-Type': 'application/octet-stream',
+                            },
+                            data=data_content)
         # TODO: Explain that if stale file handle error, user needs to
         #  restart the NFS server.
         if res.status_code not in (200, 201):
@@ -257,11 +441,34 @@ class PlatformClient(object):
                 f"Failed to upload data {data_url}"
                 f" (CODE={res.status_code} DATA={res.text})")
 
-    def download_sample(self, data_url) -> io.BytesIO:
+    def _signed_upload(self, data_url: str) -> Optional[Dict]:
+        res = self._request(
+            'get',
+            urljoin(self.server, '/data/upload_url'),
+            params={
+                'url': data_url,
+            },
+        )
+        if res.status_code != 200:
+            raise PlatformError(
+                f"Failed to get an upload URL for {data_url}"
+                f" (CODE={res.status_code} DATA={res.text})")
+        return res.json()['upload']
+
+    def download_sample(self,
+                        data_url,
+                        start: int = None,
+                        end: int = None) -> io.BytesIO:
         """
         Downloads sample data from the platform.
 
+        Pass start and/or end to only download bytes [start, end) of the
+        data, for example to read the header of a .npy file or to resume
+        an interrupted download.
+
         :param data_url: the internal url of the sample
+        :param start: the offset of the first byte to download
+        :param end: the offset after the last byte to download
         :raises PlatformError: if the download fails
         """
         res = self._request(
@@ -270,8 +477,9 @@ class PlatformClient(object):
             params={
                 'url': data_url,
             },
+            headers=_range_headers(start, end),
         )
-        if res.status_code not in (200, 201):
+        if res.status_code not in (200, 201, 206):
             raise PlatformError(
                 f"Failed to download data at {data_url}"
                 f" (CODE={res.status_code} DATA={res.text})")
@@ -307,25 +515,73 @@ class PlatformClient(object):
         raise PlatformError(f"Failed to delete sample {name} in {dataset}"
                             f" (CODE={res.status_code} DATA={res.text})")
 
+    def get_image_status(self, name: str, dataset: str) -> Dict[str, Any]:
+        """
+        Gets the status of the images of the sample, which are created
+        by a worker after the sample is registered.
+
+        :param name: the name of the sample
+        :param dataset: the dataset the sample is in
+        :return: a dictionary with the 'status' ('CREATING', 'CREATED' or
+            'FAILED'), the 'reason' the creation failed and the 'count'
+            of images
+        :raises PlatformError: if the sample has no images or an
+            unexpected error occurs
+        """
+        res = self._request(
+            'get',
+            urljoin(self.server,
+                    f'/datasets/{dataset}/samples/{name}/images/status'),
+        )
+        if res.status_code != 200:
+            raise PlatformError(
+                f"Failed to get the image status of {name} in {dataset}"
+                f" (CODE={res.status_code} DATA={res.text})")
+        return res.json()
+
+    @staticmethod
+    def _sample_info(data_url: str,
+                     image_type: str = None,
+                     label: Any = None,
+                     split: str = None,
+                     other_info: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Builds the info object of a sample to register.
+        """
+        if other_info is None:
+            info = {}
+        else:
+            info = other_info.copy()
+        if data_url:
+            info['data'] = {
+                'url': data_url
+            }
+        if image_type:
+            info['image'] = {
+                'type': image_type,
+            }
+        info['label'] = label
+        info['split'] = split
+        return info
+
     def _request(self, method, url, **kwargs) -> requests.Response:
         """
-        Wrapper around requests.request() that handles authentication
+        Wrapper around Session.request() that handles authentication
         and retries.
 
         Do not use requests.request() or its variant (requests.get())
         if this method is a better choice.
         """
-        if 'headers' not in kwargs:
-            kwargs['headers'] = {
-                'Authorization': 'Bearer {}'.format(self.__access_token)
-            }
+        kwargs['headers'] = dict(kwargs.get('headers') or {})
+        kwargs['headers'].setdefault(
+            'Authorization', 'Bearer {}'.format(self.__access_token))
 
         count = 0
         while True:
             try:
-                res = requests.request(method,
-                                       url,
-                                       **kwargs)
+                res = self._session.request(method,
+                                            url,
+                                            **kwargs)
             except (requests.ConnectionError, requests.Timeout) as e:
                 if count < self.retry_limit:
                     print(f'network error for request {method} {url}: {e}')
@@ -348,7 +604,12 @@ class PlatformClient(object):
 
         assert res.status_code < 500
         if res.status_code == 401:
-            self.__access_token = self.__updated_access_token()
+            sent_authorization = kwargs['headers'].get('Authorization')
+            with self._token_lock:
+                # Another thread may have already refreshed the token
+                if sent_authorization == 'Bearer {}'.format(
+                        self.__access_token):
+                    self.__access_token = self.__updated_access_token()
             # Update the access token for the next request
             kwargs['headers']['Authorization'] = 'Bearer {}'.format(
                 self.__access_token)
@@ -357,7 +618,7 @@ class PlatformClient(object):
         return res
 
     def __updated_access_token(self) -> str:
-        res = requests.post(
+        res = self._session.post(
             urljoin(self.server, '/login'),
             json={
                 'email': self.email,
@@ -370,3 +631,565 @@ class PlatformClient(object):
             raise PlatformError(
                 f"Failed to authenticate"
                 f" (CODE={res.status_code} DATA={res.text})")
+
+
+# Data at these URLs is uploaded straight to the store by upload_sample()
+_DIRECT_UPLOAD_PREFIXES = ('gs://', 'az://')
+
+
+def _content_size(data_content: Union[BinaryIO, bytes]) -> Optional[int]:
+    """
+    Returns the number of bytes left in data_content, or None if that
+    cannot be found without reading it.
+    """
+    if isinstance(data_content, (bytes, bytearray)):
+        return len(data_content)
+    try:
+        position = data_content.tell()
+        end = data_content.seek(0, io.SEEK_END)
+        data_content.seek(position)
+    except (AttributeError, OSError):
+        return None
+    return end - position
+
+
+def _fits_upload(upload: Optional[Dict], size: Optional[int]) -> bool:
+    """
+    Returns whether data of the given size can be sent with the signed
+    upload request.
+    """
+    if upload is None:
+        return False
+    max_size = upload.get('max_size')
+    if max_size is None:
+        return True
+    return size is not None and size <= max_size
+
+
+def _range_headers(start: int = None, end: int = None) -> Dict[str, str]:
+    """
+    Returns the Range header requesting bytes [start, end), if any.
+    """
+    if start is None and end is None:
+        return {}
+    if end is None:
+        return {'Range': f'bytes={start}-'}
+    if start is None:
+        start = 0
+    return {'Range': f'bytes={start}-{end - 1}'}
+
+
+class _AsyncResponse(object):
+    """
+    The status and body of an aiohttp response, which must be read before
+    the connection is released to the pool.
+    """
+
+    def __init__(self, status_code: int, reason: str, content: bytes):
+        self.status_code = status_code
+        self.reason = reason
+        self.content = content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AsyncPlatformClient(object):
+    """
+    An asyncio client for loading data into the platform.
+
+    The methods mirror those of PlatformClient but are coroutines. At most
+    max_in_flight requests are made at the same time over a shared pool of
+    keep-alive connections, so many tasks can use one client:
+
+        async with AsyncPlatformClient(server, email, password) as client:
+            await asyncio.gather(*[client.upload_sample(url, content)
+                                   for url, content in ...])
+
+    This requires aiohttp to be installed.
+    """
+    retry_limit = 5
+
+    def __init__(self,
+                 server: str,
+                 email: str,
+                 password: str,
+                 max_in_flight: int = 100):
+        """
+        :param server: the URL of the server (ex. http://35.35.35.35)
+        :param email: the email of a registered user
+        :param password: the password of the user
+        :param max_in_flight: the maximum number of concurrent requests
+            (and pooled connections) to the server
+        """
+        if aiohttp is None:
+            raise ImportError('aiohttp must be installed to use'
+                              ' AsyncPlatformClient')
+        self.server = server
+        self.email = email
+        self.__password = password
+        self.max_in_flight = max_in_flight
+        self.__access_token = None
+        # The session, semaphore and lock are bound to an event loop so
+        # they are created by the first request.
+        self._session = None
+        self._semaphore = None
+        self._token_lock = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        """
+        Closes the pooled connections of the client.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def list_datasets(self, fields: List[str] = None) -> List[Dict]:
+        """See PlatformClient.list_datasets()."""
+        params = {}
+        if fields:
+            params['fields'] = ','.join(fields)
+        res = await self._request(
+            'get',
+            urljoin(self.server, '/datasets/'),
+            params=params,
+        )
+        return res.json()['datasets']
+
+    async def create_dataset(self,
+                             name: str,
+                             description: str = None,
+                             info: Dict = None) -> bool:
+        """See PlatformClient.create_dataset()."""
+        if info is None:
+            info = {}
+        else:
+            info = info.copy()
+        if description:
+            info['description'] = description
+        payload = {
+            'info': info,
+        }
+        res = await self._request(
+            'put',
+            urljoin(self.server, f'/datasets/{name}'),
+            json=payload,
+        )
+
+        if res.status_code == 200:
+            return True
+        if res.status_code == 409:
+            return False
+        raise PlatformError(
+            f"Failed to create dataset {name}"
+            f" (CODE={res.status_code} DATA={res.text})")
+
+    async def delete_dataset(self,
+                             name: str) -> bool:
+        """See PlatformClient.delete_dataset()."""
+        res = await self._request(
+            'delete',
+            urljoin(self.server, f'/datasets/{name}'),
+        )
+        if res.status_code == 200:
+            return True
+        if res.status_code == 404:
+            return False
+        raise PlatformError(
+            f"Failed to delete dataset {name}"
+            f" (CODE={res.status_code} DATA={res.text})")
+
+    async def list_samples(self,
+                           dataset: str,
+                           page_size: int = 1000,
+                           fields: List[str] = None) -> AsyncIterator[Dict]:
+        """
+        See PlatformClient.list_samples(). This is an async generator:
+
+            async for sample in client.list_samples(dataset):
+                ...
+        """
+        cursor = None
+        while True:
+            params = {'limit': page_size}
+            if fields:
+                params['fields'] = ','.join(fields)
+            if cursor:
+                params['cursor'] = cursor
+            res = await self._request(
+                'get',
+                urljoin(self.server, f'/datasets/{dataset}/samples/'),
+                params=params,
+            )
+            if res.status_code != 200:
+                raise PlatformError(
+                    f"Could not list samples"
+                    f" (CODE={res.status_code} DATA={res.text})")
+            page = res.json()
+            for sample in page['samples']:
+                yield sample
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+
+    async def create_sample(self,
+                            name: str,
+                            dataset: str,
+                            data_url: str,
+                            data_content: Union[BinaryIO, bytes],
+                            image_type: str = None,
+                            label: Any = None,
+                            split: str = None,
+                            other_info: Dict[str, Any] = None) -> bool:
+        """See PlatformClient.create_sample()."""
+        await self.upload_sample(data_url, data_content)
+        return await self.register_sample(
+            name,
+            dataset,
+            data_url,
+            validate=False,
+            image_type=image_type,
+            label=label,
+            split=split,
+            other_info=other_info,
+        )
+
+    async def register_sample(self,
+                              name: str,
+                              dataset: str,
+                              data_url: str,
+                              validate: bool = True,
+                              image_type: str = None,
+                              label: Any = None,
+                              split: str = None,
+                              other_info: Dict[str, Any] = None) -> bool:
+        """See PlatformClient.register_sample()."""
+        info = PlatformClient._sample_info(data_url,
+                                           image_type=image_type,
+                                           label=label,
+                                           split=split,
+                                           other_info=other_info)
+        payload = {
+            'validate': validate,
+            'info': info,
+        }
+        res = await self._request(
+            'put',
+            urljoin(self.server, f'/datasets/{dataset}/samples/{name}'),
+            json=payload,
+        )
+
+        if res.status_code == 200:
+            return True
+        if res.status_code == 409:
+            return False
+        raise PlatformError(
+            f"Failed to create sample {name} in {dataset}"
+            f" (CODE={res.status_code} DATA={res.text})")
+
+    async def register_samples(
+            self,
+            dataset: str,
+            samples: Union[Iterable[Dict[str, Any]],
+                           AsyncIterable[Dict[str, Any]]],
+            validate: bool = True,
+            batch_size: int = 1000) -> List[Dict]:
+        """
+        See PlatformClient.register_samples().
+
+        Batches are registered concurrently. At most max_in_flight batches
+        are read from the samples before being registered. samples can
+        also be an async iterable. A plain iterable is read in the default
+        executor, so a generator which saves each sample as it is read does
+        not block the event loop.
+        """
+        read_batch = self._batch_reader(samples, batch_size)
+        tasks = []
+        pending = set()
+        while True:
+            batch = await read_batch()
+            if not batch:
+                break
+            task = asyncio.ensure_future(
+                self._register_batch(dataset, batch, validate))
+            tasks.append(task)
+            pending.add(task)
+            if len(pending) >= self.max_in_flight:
+                _, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+            else:
+                # Let the batch start while the next one is read
+                await asyncio.sleep(0)
+
+        statuses = []
+        for task in tasks:
+            statuses.extend(await task)
+        return statuses
+
+    @staticmethod
+    def _batch_reader(
+            samples: Union[Iterable[Dict[str, Any]],
+                           AsyncIterable[Dict[str, Any]]],
+            batch_size: int) -> Callable[[], Awaitable[List[Dict]]]:
+        """
+        Returns a coroutine function which reads the next batch of at most
+        batch_size samples, or an empty list once samples is exhausted.
+        """
+        if hasattr(samples, '__aiter__'):
+            async_iterator = samples.__aiter__()
+
+            async def read_async_batch():
+                batch = []
+                while len(batch) < batch_size:
+                    try:
+                        batch.append(await async_iterator.__anext__())
+                    except StopAsyncIteration:
+                        break
+                return batch
+
+            return read_async_batch
+
+        iterator = iter(samples)
+        loop = asyncio.get_event_loop()
+
+        async def read_batch():
+            return await loop.run_in_executor(
+                None, lambda: list(itertools.islice(iterator, batch_size)))
+
+        return read_batch
+
+    async def _register_batch(self,
+                              dataset: str,
+                              batch: List[Dict[str, Any]],
+                              validate: bool) -> List[Dict]:
+        payload = {
+            'validate': validate,
+            'samples': [
+                {
+                    'name': s['name'],
+                    'info': PlatformClient._sample_info(
+                        s['data_url'],
+                        image_type=s.get('image_type'),
+                        label=s.get('label'),
+                        split=s.get('split'),
+                        other_info=s.get('other_info')),
+                }
+                for s in batch
+            ],
+        }
+        res = await self._request(
+            'post',
+            urljoin(self.server, f'/datasets/{dataset}/samples/'),
+            json=payload,
+        )
+        if res.status_code != 200:
+            raise PlatformError(
+                f"Failed to register samples in {dataset}"
+                f" (CODE={res.status_code} DATA={res.text})")
+        return res.json()['samples']
+
+    async def upload_sample(self,
+                            data_url: str,
+                            data_content: Union[BinaryIO, bytes],
+                            direct: bool = True):
+        """See PlatformClient.upload_sample()."""
+        if not isinstance(data_content, bytes):
+            data_content = data_content.read()
+
+        if direct and data_url.startswith(_DIRECT_UPLOAD_PREFIXES):
+            upload = await self._signed_upload(data_url)
+            if _fits_upload(upload, len(data_content)):
+                async with self._semaphore:
+                    async with self._session.request(
+                            upload['method'],
+                            upload['url'],
+                            headers=upload['headers'],
+                            data=data_content) as raw_res:
+                        res = _AsyncResponse(raw_res.status,
+                                             raw_res.reason,
+                                             await raw_res.read())
+                if not 200 <= res.status_code < 300:
+                    raise PlatformError(
+                        f"Failed to upload data {data_url}"
+                        f" (CODE={res.status_code} DATA={res.text})")
+                return
+
+        res = await self._request(
+            'put',
+            urljoin(self.server, '/data/objects'),
+            params={
+                'url': data_url,
+            },
+            headers={
+                'Content-Type': 'application/octet-stream',
+            },
+            data=data_content)
+        if res.status_code not in (200, 201):
+            raise PlatformError(
+                f"Failed to upload data {data_url}"
+                f" (CODE={res.status_code} DATA={res.text})")
+
+    async def _signed_upload(self, data_url: str) -> Optional[Dict]:
+        res = await self._request(
+            'get',
+            urljoin(self.server, '/data/upload_url'),
+            params={
+                'url': data_url,
+            },
+        )
+        if res.status_code != 200:
+            raise PlatformError(
+                f"Failed to get an upload URL for {data_url}"
+                f" (CODE={res.status_code} DATA={res.text})")
+        return res.json()['upload']
+
+    async def download_sample(self,
+                              data_url,
+                              start: int = None,
+                              end: int = None) -> io.BytesIO:
+        """See PlatformClient.download_sample()."""
+        res = await self._request(
+            'get',
+            urljoin(self.server, '/data/download'),
+            params={
+                'url': data_url,
+            },
+            headers=_range_headers(start, end),
+        )
+        if res.status_code not in (200, 201, 206):
+            raise PlatformError(
+                f"Failed to download data at {data_url}"
+                f" (CODE={res.status_code} DATA={res.text})")
+        return io.BytesIO(res.content)
+
+    async def delete_sample(self,
+                            name: str,
+                            dataset: str,
+                            purge=False) -> bool:
+        """See PlatformClient.delete_sample()."""
+        payload = {
+            'purge': purge,
+        }
+        res = await self._request(
+            'delete',
+            urljoin(self.server, f'/datasets/{dataset}/samples/{name}'),
+            json=payload,
+        )
+
+        if res.status_code == 200:
+            return True
+        if res.status_code == 404:
+            return False
+        raise PlatformError(f"Failed to delete sample {name} in {dataset}"
+                            f" (CODE={res.status_code} DATA={res.text})")
+
+    async def get_image_status(self,
+                               name: str,
+                               dataset: str) -> Dict[str, Any]:
+        """See PlatformClient.get_image_status()."""
+        res = await self._request(
+            'get',
+            urljoin(self.server,
+                    f'/datasets/{dataset}/samples/{name}/images/status'),
+        )
+        if res.status_code != 200:
+            raise PlatformError(
+                f"Failed to get the image status of {name} in {dataset}"
+                f" (CODE={res.status_code} DATA={res.text})")
+        return res.json()
+
+    def _ensure_session(self):
+        if self._session is None:
+            # The connector limit matches the semaphore so every request
+            # that is let through has a pooled connection.
+            connector = aiohttp.TCPConnector(limit=self.max_in_flight)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._token_lock = asyncio.Lock()
+
+    async def _request(self, method, url, **kwargs) -> _AsyncResponse:
+        """
+        Wrapper around ClientSession.request() that handles
+        authentication, retries and the in-flight limit.
+        """
+        self._ensure_session()
+        if self.__access_token is None:
+            async with self._token_lock:
+                if self.__access_token is None:
+                    self.__access_token = await self.__updated_access_token()
+        kwargs['headers'] = dict(kwargs.get('headers') or {})
+        kwargs['headers'].setdefault(
+            'Authorization', 'Bearer {}'.format(self.__access_token))
+
+        count = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    async with self._session.request(method,
+                                                     url,
+                                                     **kwargs) as raw_res:
+                        res = _AsyncResponse(raw_res.status,
+                                             raw_res.reason,
+                                             await raw_res.read())
+            except (aiohttp.ClientConnectionError,
+                    asyncio.TimeoutError) as e:
+                if count < self.retry_limit:
+                    print(f'network error for request {method} {url}: {e}')
+                    count += 1
+                    await asyncio.sleep(2 ** count)
+                else:
+                    raise e
+            else:
+                if res.status_code >= 500:
+                    if count < self.retry_limit:
+                        print(
+                            f'server error for request {method} {url}:'
+                            f' {res.reason}')
+                        count += 1
+                        await asyncio.sleep(2 ** count)
+                    else:
+                        raise PlatformError(
+                            f"Server error for request {method} {url}"
+                            f" (CODE={res.status_code} DATA={res.text})")
+                else:
+                    break  # break out of the while loop
+
+        assert res.status_code < 500
+        if res.status_code == 401:
+            sent_authorization = kwargs['headers'].get('Authorization')
+            async with self._token_lock:
+                # Another task may have already refreshed the token
+                if sent_authorization == 'Bearer {}'.format(
+                        self.__access_token):
+                    self.__access_token = await self.__updated_access_token()
+            # Update the access token for the next request
+            kwargs['headers']['Authorization'] = 'Bearer {}'.format(
+                self.__access_token)
+            return await self._request(method, url,
+                                       **kwargs)
+        return res
+
+    async def __updated_access_token(self) -> str:
+        async with self._session.post(
+                urljoin(self.server, '/login'),
+                json={
+                    'email': self.email,
+                    'password': self.__password,
+                }) as res:
+            text = await res.text()
+            if res.status == 200:
+                return json.loads(text)['access_token']
+            else:
+                raise PlatformError(
+                    f"Failed to authenticate"
+                    f" (CODE={res.status} DATA={text})")
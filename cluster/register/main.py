@@ -10,13 +10,16 @@ FILESYSTEM_STORE_ROOT: the path where the FILESYSTEM_STORE_ROOT is mounted
 """
 import argparse
 import asyncio
+import collections
+import concurrent.futures
 import json
 import logging
 import os
 import pathlib
 import shutil
+import threading
 import time
-from typing import Dict
+from typing import AsyncIterator, Dict, Optional
 
 import numpy
 import tensorflow
@@ -26,6 +29,12 @@ import blueno
 
 SERVER_HOST = os.environ['BLUENO_SERVER']
 FILESYSTEM_STORE_ROOT = os.environ['FILESYSTEM_STORE_ROOT']
+# The number of samples registered per request
+REGISTER_BATCH_SIZE = 1000
+# The number of batches registered concurrently
+MAX_IN_FLIGHT = 4
+# The number of samples saved to the filesystem store concurrently
+SAVE_THREADS = 8
 
 
 async def prepare_dataset(builder_name: str, email: str, password: str):
@@ -49,30 +58,84 @@ async def prepare_dataset(builder_name: str, email: str, password: str):
     builder.download_and_prepare(download_dir=download_dir)
     d = tensorflow_datasets.as_numpy(builder.as_dataset(shuffle_files=False))
 
-    client = blueno.PlatformClient(SERVER_HOST, email, password)
-
     info = json.loads(builder.info.as_json)
-    client.create_dataset(builder_name, info=info)
-
-    tasks = []
-    for split_name, dataset in d.items():
-        for i, sample in enumerate(dataset):
-            t = loop.create_task(
-                register_sample(client, builder_name, sample, split_name, i))
-            tasks.append(t)
-            # Limit concurrency
-            two_gb = 2 * 10 ** 6
-            max_conns = 1000
-            est_max_arrays_in_mem = two_gb / sample['image'].nbytes
-            if len(tasks) >= min(max_conns, 0.75 * est_max_arrays_in_mem):
-                for t in tasks:
-                    await t
-                    t.result()
-                tasks = []
+
+    # Samples are saved by a thread pool while the event loop registers
+    # the samples saved so far
+    loop = asyncio.get_event_loop()
+    saved = asyncio.Queue()
+    stopped = threading.Event()
+    saving = loop.run_in_executor(
+        None, save_samples, builder_name, d, saved, loop, stopped)
+    start = time.time()
+    try:
+        async with blueno.AsyncPlatformClient(
+                SERVER_HOST, email, password,
+                max_in_flight=MAX_IN_FLIGHT) as client:
+            await client.create_dataset(builder_name, info=info)
+            statuses = await client.register_samples(
+                builder_name,
+                drain(saved),
+                batch_size=REGISTER_BATCH_SIZE)
+    finally:
+        stopped.set()
+        # Raises the error of a failed save
+        await saving
+    end = time.time()
+    for status in statuses:
+        if status['status'] == 'invalid':
+            logging.warning(f"failed to register sample {status['name']}:"
+                            f" {status['message']}")
+    logging.info(f'registered {len(statuses)} samples'
+                 f' in {end - start} seconds')
 
     shutil.rmtree(download_dir / builder_name, ignore_errors=True)
 
 
+def save_samples(dataset_name: str,
+                 d: Dict,
+                 saved: asyncio.Queue,
+                 loop: asyncio.AbstractEventLoop,
+                 stopped: threading.Event):
+    """
+    Saves the samples of each split of d with SAVE_THREADS threads. The
+    register kwargs of each saved sample are put in saved, followed by
+    None once every sample is saved or stopped is set.
+
+    This blocks, so it should be run in an executor.
+    """
+    def put(sample: Optional[Dict]):
+        loop.call_soon_threadsafe(saved.put_nowait, sample)
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(SAVE_THREADS) as executor:
+            # Bounds the samples read from the dataset but not yet saved
+            futures = collections.deque()
+            for split_name, dataset in d.items():
+                for i, sample in enumerate(dataset):
+                    if stopped.is_set():
+                        return
+                    futures.append(executor.submit(
+                        save_sample, dataset_name, sample, split_name, i))
+                    if len(futures) >= 2 * SAVE_THREADS:
+                        put(futures.popleft().result())
+            while futures:
+                put(futures.popleft().result())
+    finally:
+        put(None)
+
+
+async def drain(saved: asyncio.Queue) -> AsyncIterator[Dict]:
+    """
+    Yields the samples put in saved until None is put.
+    """
+    while True:
+        sample = await saved.get()
+        if sample is None:
+            return
+        yield sample
+
+
 def decode(value):
     if isinstance(value, str):
         return value
@@ -87,17 +150,16 @@ def decode(value):
     raise TypeError(f"Cannot decode value of type {type(value)}")
 
 
-async def register_sample(client: blueno.PlatformClient,
-                          dataset_name: str,
-                          sample: Dict,
-                          split_name: str,
-                          sample_no: int):
+def save_sample(dataset_name: str,
+                sample: Dict,
+                split_name: str,
+                sample_no: int) -> Dict:
     """
-    Register the sample under file://data/{dataset_name}. The name
+    Saves the sample under file://data/{dataset_name}. The name
     of the sample is derived from the sample info if possible.
-    """
-    start = time.time()
 
+    :return: the keyword arguments to register the sample with
+    """
     for key in sample:
         if key in ('filename', 'file_name',
                    'image/filename', 'image/file_name'):
@@ -106,7 +168,7 @@ async def register_sample(client: blueno.PlatformClient,
     else:
         sample_name = f'{split_name}-{sample_no}'
 
-    logging.info(f'registering sample {sample_name}')
+    logging.info(f'saving sample {sample_name}')
 
     arr = sample['image']
     if 'label' in sample:
@@ -127,20 +189,16 @@ async def register_sample(client: blueno.PlatformClient,
     abs_sample_path.parent.mkdir(parents=True, exist_ok=True)
     numpy.save(abs_sample_path, arr)
 
-    client.register_sample(
-        sample_name,
-        dataset_name,
-        data_url=f'file://{rel_sample_path}',
-        image_type='2D',
-        label=label,
-        split=split_name,
-        other_info={
+    return {
+        'name': sample_name,
+        'data_url': f'file://{rel_sample_path}',
+        'image_type': '2D',
+        'label': label,
+        'split': split_name,
+        'other_info': {
             'feature': feature_info,
         },
-    )
-
-    end = time.time()
-    logging.info(f'registered sample {sample_name} in {end - start} seconds')
+    }
 
 
 if __name__ == '__main__':
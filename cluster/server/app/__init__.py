@@ -7,13 +7,14 @@ import os
 import flask
 import flask_jwt_extended
 
-from app import db, env
+from app import db, env, green
 from app.routes.auth import auth_bp
 from app.routes.data import data_bp
 from app.routes.datasets import datasets_bp
 from app.routes.register import register_bp
 from app.routes.sample_images import sample_images_bp
 from app.routes.samples import samples_bp
+from app.routes.stats import stats_bp
 
 logging.config.dictConfig({
     'version': 1,
@@ -41,6 +42,12 @@ logging.config.dictConfig({
     }
 })
 
+if green.is_patched():
+    # Running in a gunicorn gevent worker
+    green.patch_psycopg2()
+    if env.GEVENT_BLOCKING_LOG_THRESHOLD > 0:
+        green.monitor_blocking(env.GEVENT_BLOCKING_LOG_THRESHOLD)
+
 app = flask.Flask(__name__,
                   template_folder='../build',
                   static_folder='../build/static',
@@ -52,6 +59,7 @@ app.register_blueprint(datasets_bp)
 app.register_blueprint(samples_bp)
 app.register_blueprint(sample_images_bp)
 app.register_blueprint(register_bp)
+app.register_blueprint(stats_bp)
 
 app.config['JWT_SECRET_KEY'] = env.JWT_SECRET_KEY
 jwt = flask_jwt_extended.JWTManager(app)
@@ -88,3 +96,10 @@ def handle_not_found(error):
     response = flask.jsonify(error.to_dict())
     response.status_code = error.status_code
     return response
+
+
+@app.errorhandler(db.PoolError)
+def handle_pool_error(error):
+    response = flask.jsonify(error.to_dict())
+    response.status_code = error.status_code
+    return response
@@ -24,6 +24,7 @@ def test_user() -> Tuple[str, str]:
         postgresql = testing.postgresql.Postgresql()
         env.POSTGRES_CONFIG = postgresql.dsn()
         db.init_db()
+        db.migrate()
 
     conn = psycopg2.connect(**env.POSTGRES_CONFIG)
     with conn.cursor() as cur:
@@ -4,10 +4,18 @@ Application database-layer.
 All database queries should be made in this module to make
 it easier to handle schema changes or improve performance.
 """
+import base64
+import binascii
+import contextlib
+import os
 import pathlib
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
 import flask
 import psycopg2
+import psycopg2.extensions
 
 from app import env
 
@@ -30,9 +38,218 @@ class NotFoundException(Exception):
         return {'message': self.message}
 
 
+class PoolError(Exception):
+    def __init__(self, message, status_code=503):
+        self.message = message
+        self.status_code = status_code
+
+    def to_dict(self):
+        return {'message': self.message}
+
+
+class ConnectionPool(object):
+    """
+    A process-wide pool of Postgres connections.
+
+    Checking out a connection blocks until one of the maxconn connections
+    is free, or raises PoolError after timeout seconds. gunicorn's gevent
+    workers monkey-patch threading, so waiting for a connection yields to
+    the other greenlets of the worker.
+
+    Idle connections are kept open. A connection that has been idle for
+    more than check_interval seconds is pinged before it is checked out.
+    """
+
+    def __init__(self,
+                 config: Dict,
+                 minconn: int,
+                 maxconn: int,
+                 check_interval: float,
+                 timeout: Optional[float] = None):
+        self.config = config
+        self.maxconn = maxconn
+        self.check_interval = check_interval
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self._idle: List[Tuple[psycopg2.extensions.connection, float]] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._stats = {
+            'checkouts': 0,
+            'waiting': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'timeouts': 0,
+            'connections_opened': 0,
+            'connections_discarded': 0,
+        }
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def getconn(self) -> psycopg2.extensions.connection:
+        """
+        Checks out a healthy connection. Return it with putconn().
+        """
+        start = time.monotonic()
+        with self._lock:
+            self._stats['waiting'] += 1
+        acquired = self._slots.acquire(timeout=self.timeout)
+        wait_seconds = time.monotonic() - start
+        with self._lock:
+            if not acquired:
+                self._stats['waiting'] -= 1
+                self._stats['timeouts'] += 1
+        if not acquired:
+            raise PoolError(f'No database connection was free after '
+                            f'{wait_seconds:.1f} seconds')
+        with self._lock:
+            self._stats['waiting'] -= 1
+            self._stats['checkouts'] += 1
+            self._stats['wait_seconds_total'] += wait_seconds
+            self._stats['wait_seconds_max'] = max(
+                self._stats['wait_seconds_max'], wait_seconds)
+
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    # The most recently used connection is the least likely
+                    # to have gone stale
+                    conn, last_used = self._idle.pop()
+                if self._is_healthy(conn, last_used):
+                    return conn
+                self._discard(conn)
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn: psycopg2.extensions.connection):
+        """
+        Returns the connection to the pool, rolling back any transaction
+        left open.
+        """
+        try:
+            if conn.closed:
+                self._discard(conn)
+                return
+            status = conn.get_transaction_status()
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                self._discard(conn)  # The server connection was lost
+                return
+            if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        except psycopg2.Error:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+
+    def stats(self) -> Dict:
+        """
+        Returns counters of the pool, including how long requests have
+        waited for a connection.
+        """
+        with self._lock:
+            stats = self._stats.copy()
+            stats['idle'] = len(self._idle)
+        stats['maxconn'] = self.maxconn
+        return stats
+
+    def _connect(self) -> psycopg2.extensions.connection:
+        conn = psycopg2.connect(**self.config)
+        with self._lock:
+            self._stats['connections_opened'] += 1
+        return conn
+
+    def _discard(self, conn: psycopg2.extensions.connection):
+        with self._lock:
+            self._stats['connections_discarded'] += 1
+        if not conn.closed:
+            conn.close()
+
+    def _is_healthy(self,
+                    conn: psycopg2.extensions.connection,
+                    last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1;')
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Returns the connection pool of this process, creating it on first use.
+
+    A pool inherited from a parent process is replaced since forked
+    processes cannot share connections.
+    """
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                _pool = ConnectionPool(env.POSTGRES_CONFIG,
+                                       env.POSTGRES_POOL_MIN,
+                                       env.POSTGRES_POOL_MAX,
+                                       env.POSTGRES_POOL_CHECK_INTERVAL,
+                                       env.POSTGRES_POOL_TIMEOUT)
+    return _pool
+
+
+@contextlib.contextmanager
+def pooled_conn():
+    """
+    Checks out a connection from the pool for the duration of
+    the with block. Use get_conn() in request handlers instead.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
+def stream_rows(query: str,
+                params: Tuple,
+                itersize: int) -> Iterator[Tuple]:
+    """
+    Yields the rows of the query, fetching itersize rows at a time from a
+    server-side cursor so the whole result is never held in memory.
+
+    The connection is checked out of the pool until the generator is
+    exhausted or closed, so this can outlive the request handler.
+    """
+    with pooled_conn() as conn:
+        # Named cursors are server-side cursors
+        with conn.cursor(name='stream_rows') as cur:
+            cur.itersize = itersize
+            cur.execute(query, params)
+            yield from cur
+
+
 def get_conn():
     if 'db' not in flask.g:
-        flask.g.db = psycopg2.connect(**env.POSTGRES_CONFIG)
+        flask.g.db = get_pool().getconn()
     return flask.g.db
 
 
@@ -40,7 +257,7 @@ def close_conn(e=None):
     # teardown_appcontext requires close_conn to have a positional argument
     db = flask.g.pop('db', None)
     if db is not None:
-        db.close()
+        get_pool().putconn(db)
 
 
 def init_db():
@@ -51,6 +268,63 @@ def init_db():
     conn.commit()
 
 
+# Arbitrary key of the advisory lock held while migrating
+_MIGRATION_LOCK_KEY = 7427
+
+
+def migrate() -> List[str]:
+    """
+    Applies the migrations in migrations/ that have not been applied yet.
+
+    Migrations are SQL files named <version>_<description>.sql and are
+    applied in order of version, each in its own transaction. An advisory
+    lock makes it safe for several server pods to migrate at once.
+    init_db() must be called first.
+
+    :return: the file names of the applied migrations
+    """
+    migrations_dir = (pathlib.Path(__file__) / '..' / 'migrations').resolve()
+    migrations = sorted((int(path.name.split('_', maxsplit=1)[0]), path)
+                        for path in migrations_dir.glob('*.sql'))
+
+    applied = []
+    conn = psycopg2.connect(**env.POSTGRES_CONFIG)
+    try:
+        for version, path in migrations:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT pg_advisory_xact_lock(%s);
+                    """,
+                    (_MIGRATION_LOCK_KEY,)
+                )
+                cur.execute(
+                    """
+                    SELECT version
+                    FROM schema_migrations
+                    WHERE version = %s;
+                    """,
+                    (version,)
+                )
+                if cur.fetchone() is None:
+                    cur.execute(path.read_text())
+                    cur.execute(
+                        """
+                        INSERT INTO schema_migrations (
+                            version,
+                            name,
+                            applied_at)
+                        VALUES (%s, %s, now());
+                        """,
+                        (version, path.name)
+                    )
+                    applied.append(path.name)
+            conn.commit()
+    finally:
+        conn.close()
+    return applied
+
+
 def dataset_id(cur, dataset_name):
     cur.execute(
         """
@@ -64,3 +338,83 @@ def dataset_id(cur, dataset_name):
     if result is None:
         raise NotFoundException(f"Dataset '{dataset_name}' was not found")
     return result[0]
+
+
+def encode_cursor(last_id: int) -> str:
+    """
+    Returns an opaque cursor for resuming a listing after the row
+    with the given id.
+    """
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Returns the id encoded by encode_cursor().
+
+    :raise ValueError: if the cursor is invalid
+    """
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor '{cursor}'") from e
+
+
+def next_cursor(rows: List[Tuple], limit: Optional[str]) -> Optional[str]:
+    """
+    Returns the cursor of the page after the given rows, or None if
+    there are no more rows. The id must be the first column of each row.
+    """
+    if limit is None or not rows or len(rows) < int(limit):
+        return None
+    return encode_cursor(rows[-1][0])
+
+
+def select_fields(fields: str,
+                  columns: Dict[str, str],
+                  jsonb_columns: Set[str]) -> Tuple[str, Tuple, List[List]]:
+    """
+    Builds a select list that only fetches the given fields.
+
+    Fields are comma-separated. Subfields of jsonb columns are selected
+    with dots (ex. 'name,info.label') so that the rest of the jsonb
+    is never sent by the database.
+
+    :param fields: the comma-separated fields
+    :param columns: the SQL expression of each top-level field
+    :param jsonb_columns: the top-level fields that have subfields
+    :return: the select list, its query params and the path of each
+        selected column, to be passed to project_row()
+    :raise ValueError: if a field is not valid
+    """
+    expressions = []
+    params = []
+    paths = []
+    for field in fields.split(','):
+        path = field.strip().split('.')
+        if path[0] not in columns:
+            raise ValueError(f"Unknown field '{field}'")
+        if len(path) == 1:
+            expressions.append(columns[path[0]])
+        elif path[0] in jsonb_columns and all(path[1:]):
+            expressions.append(f'{columns[path[0]]} #> %s')
+            params.append(path[1:])
+        else:
+            raise ValueError(f"Invalid field '{field}'")
+        paths.append(path)
+    return ', '.join(expressions), tuple(params), paths
+
+
+def project_row(row: Tuple, paths: List[List]) -> Dict:
+    """
+    Nests the columns selected with select_fields() into a dictionary.
+    """
+    result = {}
+    for value, path in zip(row, paths):
+        obj = result
+        for key in path[:-1]:
+            if not isinstance(obj.get(key), dict):
+                obj[key] = {}
+            obj = obj[key]
+        obj[path[-1]] = value
+    return result
@@ -0,0 +1,91 @@
+import psycopg2
+import pytest
+
+from app import db, env
+
+
+@pytest.fixture
+def pool(test_user):
+    pool = db.ConnectionPool(env.POSTGRES_CONFIG,
+                             minconn=1,
+                             maxconn=2,
+                             check_interval=0)
+    yield pool
+    pool.closeall()
+
+
+def test_pool_reuses_connections(pool: db.ConnectionPool):
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    pool.putconn(conn)
+
+    stats = pool.stats()
+    assert stats['checkouts'] == 2
+    assert stats['connections_opened'] == 1
+    assert stats['idle'] == 1
+
+
+def test_pool_rolls_back_open_transactions(pool: db.ConnectionPool):
+    conn = pool.getconn()
+    with conn.cursor() as cur:
+        cur.execute('SELECT 1;')
+    assert (conn.get_transaction_status()
+            != psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+    pool.putconn(conn)
+    assert (conn.get_transaction_status()
+            == psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+
+
+def test_pool_discards_closed_connections(pool: db.ConnectionPool):
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.close()
+
+    new_conn = pool.getconn()
+    assert new_conn is not conn
+    assert not new_conn.closed
+    pool.putconn(new_conn)
+    assert pool.stats()['connections_discarded'] == 1
+
+
+def test_pool_times_out(pool: db.ConnectionPool):
+    pool.timeout = 0.1
+    conns = [pool.getconn(), pool.getconn()]
+    with pytest.raises(db.PoolError):
+        pool.getconn()
+    stats = pool.stats()
+    assert stats['timeouts'] == 1
+    assert stats['waiting'] == 0
+
+    for conn in conns:
+        pool.putconn(conn)
+    pool.putconn(pool.getconn())
+
+
+def test_pooled_conn(test_user):
+    with db.pooled_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1;')
+            assert cur.fetchone()[0] == 1
+    assert db.get_pool().stats()['checkouts'] >= 1
+
+
+def test_migrate(test_user):
+    # conftest already applied every migration
+    assert db.migrate() == []
+
+    with db.pooled_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT indexname
+                FROM pg_indexes
+                WHERE tablename = 'samples';
+                """
+            )
+            indexes = {row[0] for row in cur.fetchall()}
+    assert 'samples_dataset_id_id_idx' in indexes
+    assert 'samples_label_idx' in indexes
+    assert 'samples_split_idx' in indexes
+    assert 'samples_name_trgm_idx' in indexes
@@ -13,8 +13,51 @@ try:
 except KeyError:
     POSTGRES_CONFIG = None
 
+# Connections kept open by each server process, see db.ConnectionPool
+POSTGRES_POOL_MIN = int(os.getenv('POSTGRES_POOL_MIN', 1))
+POSTGRES_POOL_MAX = int(os.getenv('POSTGRES_POOL_MAX', 10))
+# Seconds a connection can be idle before it is pinged on checkout
+POSTGRES_POOL_CHECK_INTERVAL = float(
+    os.getenv('POSTGRES_POOL_CHECK_INTERVAL', 30))
+# Seconds to wait for a free connection before failing with a 503
+POSTGRES_POOL_TIMEOUT = float(os.getenv('POSTGRES_POOL_TIMEOUT', 30))
+
 REDIS_HOST = os.getenv('REDIS_HOST')
 
+# Greenlets blocking a gevent worker for longer than this many seconds
+# are logged. 0 disables the monitoring.
+GEVENT_BLOCKING_LOG_THRESHOLD = float(
+    os.getenv('GEVENT_BLOCKING_LOG_THRESHOLD', 0.5))
+
+# The number of samples whose images are created by one worker job when
+# samples are registered in bulk
+IMAGE_BATCH_SIZE = int(os.getenv('IMAGE_BATCH_SIZE', 50))
+# Seconds each sample adds to the timeout of an image job, by image type
+IMAGE_JOB_TIMEOUT_2D = int(os.getenv('IMAGE_JOB_TIMEOUT_2D', 60))
+IMAGE_JOB_TIMEOUT_3D = int(os.getenv('IMAGE_JOB_TIMEOUT_3D', 600))
+
+# How the slices of 3D images are scaled to 0-255: 'slice' scales each
+# slice by its own range, 'global' by the range of the whole volume
+IMAGE_VOLUME_SCALING = os.getenv('IMAGE_VOLUME_SCALING', 'slice')
+if IMAGE_VOLUME_SCALING not in ('slice', 'global'):
+    raise ValueError(f"IMAGE_VOLUME_SCALING must be 'slice' or 'global',"
+                     f" found '{IMAGE_VOLUME_SCALING}'")
+
+# The number of slices of a 3D image encoded and uploaded in parallel
+# by each worker. os.cpu_count() would be the CPUs of the k8s node, not
+# the limit of the pod.
+IMAGE_SLICE_THREADS = int(os.getenv('IMAGE_SLICE_THREADS', 4))
+
+# The maximum width and height of the smaller copies made of each image,
+# which are requested with the size param of the image routes
+IMAGE_RENDITION_SIZES = [
+    int(size) for size in
+    os.getenv('IMAGE_RENDITION_SIZES', '128,512').split(',') if size]
+# The formats of the smaller copies, jpeg and/or webp
+IMAGE_RENDITION_FORMATS = [
+    fmt for fmt in
+    os.getenv('IMAGE_RENDITION_FORMATS', 'jpeg,webp').split(',') if fmt]
+
 try:
     JWT_SECRET_KEY = os.environ['JWT_SECRET_KEY']
 except KeyError:
@@ -30,6 +73,22 @@ try:
 except KeyError:
     FILESYSTEM_STORE_ROOT = None
 
+# Bytes copied per write by the filesystem store. Tune this to the
+# wsize of NFS mounts.
+FILESYSTEM_STORE_BUFFER_SIZE = int(
+    os.getenv('FILESYSTEM_STORE_BUFFER_SIZE', 1024 * 1024))
+# Whether files are flushed to disk before they are renamed into place.
+# Off by default since each image and slice would wait for two fsyncs
+FILESYSTEM_STORE_FSYNC = os.getenv('FILESYSTEM_STORE_FSYNC',
+                                   'false') == 'true'
+# If set, filesystem objects are downloaded by nginx from this internal
+# location (ex. '/protected-files/') with X-Accel-Redirect
+FILESYSTEM_ACCEL_REDIRECT_PREFIX = os.getenv(
+    'FILESYSTEM_ACCEL_REDIRECT_PREFIX')
+# The number of hashed directory levels the filesystem store spreads
+# files over, 0 for a flat layout
+FILESYSTEM_STORE_FANOUT = int(os.getenv('FILESYSTEM_STORE_FANOUT', 0))
+
 try:
     GOOGLE_APPLICATION_CREDENTIALS = os.environ[
         'GOOGLE_APPLICATION_CREDENTIALS']
@@ -40,6 +99,13 @@ try:
 except KeyError:
     GOOGLE_APPLICATION_CREDENTIALS = None
 
+# Seconds a signed URL is reused before a new one is signed. URLs are
+# valid for 15 minutes so this leaves clients time to use them.
+SIGNED_URL_CACHE_TTL = float(os.getenv('SIGNED_URL_CACHE_TTL', 600))
+# Signs one read-only SAS per Azure container and reuses it for all of
+# its blobs instead of signing every blob
+AZURE_CONTAINER_SAS = os.getenv('AZURE_CONTAINER_SAS', '') == 'true'
+
 try:
     AZURE_STORAGE_CREDENTIALS = {
         'account_name': os.environ['AZURE_STORAGE_ACCOUNT'],
@@ -0,0 +1,71 @@
+"""
+Support for running the server in gunicorn's gevent workers.
+
+psycopg2 is a C extension so its socket I/O is not monkey-patched by
+gevent. Without a wait callback every query blocks the whole worker,
+including the greenlets of all other requests.
+"""
+import logging
+
+import gevent
+import gevent.events
+import gevent.monkey
+import gevent.socket
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+
+def is_patched() -> bool:
+    """
+    Returns true if the process has been monkey-patched by gevent,
+    for example by gunicorn's gevent worker.
+    """
+    return gevent.monkey.is_module_patched('socket')
+
+
+def gevent_wait_callback(conn, timeout=None):
+    """
+    Waits for psycopg2 I/O by yielding to the gevent hub.
+
+    See "Support for coroutine libraries" in the psycopg2 docs.
+    """
+    while True:
+        state = conn.poll()
+        if state == psycopg2.extensions.POLL_OK:
+            break
+        elif state == psycopg2.extensions.POLL_READ:
+            gevent.socket.wait_read(conn.fileno(), timeout=timeout)
+        elif state == psycopg2.extensions.POLL_WRITE:
+            gevent.socket.wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(
+                f'Bad result from poll: {state}')
+
+
+def patch_psycopg2():
+    """
+    Makes psycopg2 connections yield to other greenlets while waiting
+    on the database.
+    """
+    psycopg2.extensions.set_wait_callback(gevent_wait_callback)
+
+
+def _log_blocked(event):
+    if isinstance(event, gevent.events.EventLoopBlocked):
+        logger.warning(f'greenlet {event.greenlet} blocked the event loop'
+                       f' for more than {event.blocking_time} seconds\n'
+                       + ''.join(event.info))
+
+
+def monitor_blocking(threshold: float):
+    """
+    Logs the stack of any greenlet that blocks the event loop
+    for longer than threshold seconds.
+    """
+    gevent.config.max_blocking_time = threshold
+    # start_periodic_monitoring_thread() does nothing unless this is set
+    gevent.config.monitor_thread = True
+    gevent.events.subscribers.append(_log_blocked)
+    gevent.get_hub().start_periodic_monitoring_thread()
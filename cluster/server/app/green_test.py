@@ -0,0 +1,28 @@
+import logging
+import time
+
+import gevent
+import gevent.events
+
+from app import green
+
+
+def test_monitor_blocking(caplog, monkeypatch):
+    monkeypatch.setattr(gevent.config, 'monitor_thread', False)
+    monkeypatch.setattr(gevent.config, 'max_blocking_time',
+                        gevent.config.max_blocking_time)
+    monkeypatch.setattr(gevent.events, 'subscribers',
+                        list(gevent.events.subscribers))
+    hub = gevent.get_hub()
+
+    green.monitor_blocking(0.1)
+    try:
+        assert hub.periodic_monitoring_thread is not None
+        with caplog.at_level(logging.WARNING, logger=green.__name__):
+            # time.sleep() is not monkey-patched, so it blocks the hub
+            gevent.spawn(time.sleep, 1.5).join()
+        assert any('blocked the event loop' in record.getMessage()
+                   for record in caplog.records)
+    finally:
+        hub.periodic_monitoring_thread.kill()
+        hub.periodic_monitoring_thread = None
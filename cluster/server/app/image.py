@@ -2,55 +2,148 @@
 Image processing code.
 
 """
+import collections
+import concurrent.futures
 import io
 import json
-from typing import Dict
+import logging
+from typing import Dict, List, Optional, Tuple
 
 import numpy
-import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
 import redis
 import rq
+import rq.timeouts
 from PIL import Image
 
-from app import storage, env
+from app import db, storage, env
+
+logger = logging.getLogger(__name__)
 
 queue = rq.Queue(connection=redis.Redis(host=env.REDIS_HOST))
 
 
+# The number of slices normalized at a time, which bounds the size of the
+# float32 temporaries of _normalize()
+NORMALIZE_BLOCK_SIZE = 32
+
+
+def _normalize(arr: numpy.ndarray, per_slice=False) -> numpy.ndarray:
+    """
+    Scales the array to 0-255 into a new uint8 array.
+
+    :param arr: an image or a volume of slices along the first axis
+    :param per_slice: whether each slice of the volume is scaled by its
+        own minimum and maximum instead of those of the whole array
+    :return: the scaled array. Constant slices (or arrays) are all 0
+        instead of dividing by zero.
+    """
+    if per_slice:
+        axes = tuple(range(1, arr.ndim))
+    else:
+        axes = None
+    low = arr.min(axis=axes, keepdims=True).astype(numpy.float32)
+    span = arr.max(axis=axes, keepdims=True).astype(numpy.float32) - low
+    scale = numpy.divide(255, span,
+                         out=numpy.zeros_like(span),
+                         where=span > 0)
+
+    out = numpy.empty(arr.shape, dtype=numpy.uint8)
+    for start in range(0, arr.shape[0], NORMALIZE_BLOCK_SIZE):
+        block = slice(start, start + NORMALIZE_BLOCK_SIZE)
+        block_low = low[block] if per_slice else low
+        block_scale = scale[block] if per_slice else scale
+        scaled = numpy.subtract(arr[block], block_low, dtype=numpy.float32)
+        scaled *= block_scale
+        # Truncates like astype(numpy.uint8)
+        out[block] = scaled
+    return out
+
+
 def _create_rgb_image(arr) -> Image.Image:
-    normalized = ((arr - arr.min()) / (arr.max() - arr.min()))
-    as_rgb = (255 * normalized).astype(numpy.uint8)
-    return Image.fromarray(as_rgb)
+    return Image.fromarray(_normalize(arr))
+
+
+# The file extensions of the image formats
+EXTENSIONS = {
+    'jpeg': 'jpg',
+    'webp': 'webp',
+}
 
 
-def _upload_to_uri(img: Image.Image, uri: str):
+def _upload_to_uri(img: Image.Image, uri: str, image_format='jpeg'):
     """
     Uploads the image to the storage URI.
 
     :param img: a PIL.Image.Image object
     :param uri: the URI to save the image to (should start with gs://,
         az://, etc.)
+    :param image_format: the format to save the image in
     """
     stream = io.BytesIO()
-    img.save(stream, format='jpeg')
+    img.save(stream, format=image_format)
     stream.seek(0)
 
     storage_client = storage.get_storage_client(uri)
     storage_client.put(uri, stream)
 
 
-def _create_image_from_npy(arr, full_url):
+def _image_url(image_url_base: str, size=None, image_format='jpeg') -> str:
+    """
+    Returns the URL of the image, or of its rendition with the given
+    maximum size.
+
+    :param image_url_base: the URL of the image without an extension
+    """
+    if size is None:
+        return f'{image_url_base}.jpg'
+    return f'{image_url_base}@{size}.{EXTENSIONS[image_format]}'
+
+
+def _upload_image(img: Image.Image, image_url_base: str):
+    """
+    Uploads the image as a JPEG along with its renditions in
+    env.IMAGE_RENDITION_SIZES and env.IMAGE_RENDITION_FORMATS.
+
+    :param image_url_base: the URL of the image without an extension
+    """
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    _upload_to_uri(img, _image_url(image_url_base))
+    _upload_renditions(img, image_url_base)
+
+
+def _upload_renditions(img: Image.Image, image_url_base: str):
+    """
+    Uploads the renditions of the image without the image itself.
+
+    :param image_url_base: the URL of the image without an extension
+    """
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    for size in env.IMAGE_RENDITION_SIZES:
+        rendition = img.copy()
+        # Keeps the aspect ratio and never enlarges the image
+        rendition.thumbnail((size, size), Image.LANCZOS)
+        for image_format in env.IMAGE_RENDITION_FORMATS:
+            _upload_to_uri(rendition,
+                           _image_url(image_url_base, size, image_format),
+                           image_format)
+
+
+def _create_image_from_npy(arr, image_url_base):
     if arr.ndim == 2:
         img = _create_rgb_image(arr)
-        _upload_to_uri(img, full_url)
+        _upload_image(img, image_url_base)
     elif arr.ndim == 3:
         if arr.shape[2] == 1:
             arr_squeezed = arr.squeeze(axis=2)
             img = _create_rgb_image(arr_squeezed)
-            _upload_to_uri(img, full_url)
+            _upload_image(img, image_url_base)
         elif arr.shape[2] == 3:
             img = _create_rgb_image(arr)
-            _upload_to_uri(img, full_url)
+            _upload_image(img, image_url_base)
         else:
             raise ValueError(
                 f"3D array must have 1 or 3 channels, found {arr.shape}")
@@ -59,13 +152,47 @@ def _create_image_from_npy(arr, full_url):
             f"Array is not 2D or 3D: dimension={arr.ndim}")
 
 
+def _upload_slices(volume: numpy.ndarray, image_url_prefix: str):
+    """
+    Uploads an image of each slice of the normalized volume, encoding
+    and uploading env.IMAGE_SLICE_THREADS slices at a time.
+    """
+    def upload_slice(i):
+        img = Image.fromarray(volume[i])
+        _upload_image(img, f'{image_url_prefix}-{i}')
+
+    if env.IMAGE_SLICE_THREADS <= 1:
+        for i in range(volume.shape[0]):
+            upload_slice(i)
+        return
+    # Pillow releases the GIL while encoding and uploads wait on I/O,
+    # so threads are enough and the volume does not need to be copied
+    # to other processes
+    executor = concurrent.futures.ThreadPoolExecutor(env.IMAGE_SLICE_THREADS)
+    # Only a few slices are queued at a time, so that an error, or the rq
+    # timeout of the job, only waits for the slices already being created
+    window = collections.deque()
+    try:
+        for i in range(volume.shape[0]):
+            if len(window) >= 2 * env.IMAGE_SLICE_THREADS:
+                # Raises the first error of the slices
+                window.popleft().result()
+            window.append(executor.submit(upload_slice, i))
+        while window:
+            window.popleft().result()
+    finally:
+        for future in window:
+            future.cancel()
+        executor.shutdown()
+
+
 def _create_images(image_type: str,
                    image_url_prefix: str,
                    data_url: str) -> int:
     """
     Creates images from the given info.
 
-    :param image_type: either '2D' or '3D'
+    :param image_type: '2D', '3D' or 'FROM_DATA'
     :param image_url_prefix: the internal url prefix of the image.
         This should not end with '/' or a file extension.
     :param data_url: the internal URL of the data
@@ -78,14 +205,14 @@ def _create_images(image_type: str,
     if image_type == '2D':
         if data_url.lower().endswith('.npy'):
             arr = numpy.load(data_stream)
-            _create_image_from_npy(arr, f'{image_url_prefix}.jpg')
+            _create_image_from_npy(arr, image_url_prefix)
             return 1
         elif data_url.lower().endswith('.tfrecord'):
             raise NotImplementedError()
         else:
             # This will fail if the format is unsupported
             img = Image.open(data_stream)
-            _upload_to_uri(img, f'{image_url_prefix}.jpg')
+            _upload_image(img, image_url_prefix)
         return 1
     elif image_type == '3D':
         if data_url.lower().endswith('.npy'):
@@ -93,76 +220,248 @@ def _create_images(image_type: str,
             # TODO: This assumes the data is column first not column last.
             #  Document this somewhere
             arr = numpy.load(data_stream)
-            for i in range(arr.shape[0]):
-                img = _create_rgb_image(arr[i])
-                _upload_to_uri(img, f'{image_url_prefix}-{i}.jpg')
-            return arr.shape[0]
+            # The whole volume is normalized at once, the slices are views
+            volume = _normalize(
+                arr, per_slice=env.IMAGE_VOLUME_SCALING == 'slice')
+            _upload_slices(volume, image_url_prefix)
+            return volume.shape[0]
         else:
             raise ValueError(f'Cannot create images for'
                              f' image_type={image_type} data_url={data_url}')
+    elif image_type == 'FROM_DATA':
+        # The data is the full size image, so only the renditions are made
+        img = Image.open(data_stream)
+        _upload_renditions(img, image_url_prefix)
+        return 1
     elif image_type == 'CT':
         raise NotImplementedError(f'Image type {image_type} not supported yet')
     else:
         raise ValueError(f'Image type {image_type} not supported')
 
 
-def create_images(sample_id: int):
-    with psycopg2.connect(**env.POSTGRES_CONFIG) as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT info
-                FROM samples
-                WHERE id = %s;
-                """,
-                (sample_id,)
-            )
-            result = cur.fetchone()
-            assert result is not None
-
-        info = result[0]
-        image_type = info['image']['type']
-        image_url_prefix = info['image']['url']
-        data_url = info['data']['url']
-        try:
-            count = _create_images(image_type, image_url_prefix, data_url)
-        except Exception as e:
-            info['image']['status'] = 'FAILED'
-            info['image']['reason'] = str(e)
-        else:
-            info['image']['status'] = 'CREATED'
-            info['image']['count'] = count
-        finally:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    UPDATE samples
-                    SET info = %s
-                    WHERE id = %s;
-                    """,
-                    (json.dumps(info), sample_id,)
-                )
-            conn.commit()
-
-
-def enqueue_create_images(sample_id: int) -> rq.job.Job:
+def _create_sample_images(image_info: Dict, data_url: str):
+    """
+    Creates the images described by image_info and updates its status.
+    """
+    try:
+        count = _create_images(image_info['type'],
+                               image_info['url'],
+                               data_url)
+    except rq.timeouts.JobTimeoutException:
+        # Let the worker stop the job, see create_images_batch
+        raise
+    except Exception as e:
+        image_info['status'] = 'FAILED'
+        image_info['reason'] = str(e)
+    else:
+        image_info['status'] = 'CREATED'
+        image_info['count'] = count
+        # Kept so get_images() knows which renditions exist if the
+        # configuration changes later
+        image_info['renditions'] = {
+            'sizes': env.IMAGE_RENDITION_SIZES,
+            'formats': env.IMAGE_RENDITION_FORMATS,
+        }
+
+
+def _save_image_infos(conn: psycopg2.extensions.connection,
+                      image_infos: List[Tuple[int, Dict]]):
+    """
+    Replaces the image field of the info of each (sample_id, image_info).
+    """
+    rows = [(sample_id, json.dumps(image_info))
+            for sample_id, image_info in image_infos]
+    with conn.cursor() as cur:
+        # Only the image field is replaced, so other changes to
+        # the info made in the meantime are kept
+        psycopg2.extras.execute_values(
+            cur,
+            """
+            UPDATE samples AS s
+            SET info = jsonb_set(s.info, '{image}', v.image::jsonb)
+            FROM (VALUES %s) AS v (id, image)
+            WHERE s.id = v.id;
+            """,
+            rows,
+            page_size=len(rows),
+        )
+    conn.commit()
+
+
+def create_images_batch(
+        sample_ids: List[int],
+        conn: Optional[psycopg2.extensions.connection] = None
+) -> Dict[int, str]:
+    """
+    Creates the images of the samples and saves their image statuses.
+
+    The samples are read with one query and their statuses are saved with
+    one UPDATE, using a single connection for the whole batch. If the job
+    is stopped, for example by its rq timeout, the statuses are still saved
+    and the samples whose images were not created are marked as FAILED
+    instead of staying CREATING.
+
+    :param conn: the connection to use. Request handlers should pass the
+        connection of the request. Checking out a second connection
+        deadlocks a worker whose requests already hold every connection.
+    :return: the new image status of each sample, 'CREATED' or 'FAILED'.
+        Samples which were deleted before the job ran are left out.
+    """
+    if conn is None:
+        # rq workers don't have a request context
+        with db.pooled_conn() as conn:
+            return create_images_batch(sample_ids, conn)
+
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT id, info
+            FROM samples
+            WHERE id = ANY(%s);
+            """,
+            (list(sample_ids),)
+        )
+        results = cur.fetchall()
+    # Do not stay idle in a transaction while the images are created
+    conn.commit()
+
+    statuses = {}
+    try:
+        for sample_id, info in results:
+            _create_sample_images(info['image'], info['data']['url'])
+            statuses[sample_id] = info['image']['status']
+    finally:
+        for sample_id, info in results:
+            if sample_id not in statuses:
+                info['image']['status'] = 'FAILED'
+                info['image']['reason'] = ('The image job stopped before'
+                                           ' the images were created')
+        if results:
+            _save_image_infos(conn, [(sample_id, info['image'])
+                                     for sample_id, info in results])
+    return statuses
+
+
+def create_images(
+        sample_id: int,
+        conn: Optional[psycopg2.extensions.connection] = None
+) -> Optional[str]:
+    """
+    Creates the images of the sample and saves the image status.
+
+    :param conn: see create_images_batch
+    :return: the new image status, 'CREATED' or 'FAILED', or None if the
+        sample was deleted before its images were created
+    """
+    statuses = create_images_batch([sample_id], conn)
+    if sample_id not in statuses:
+        logger.info(f'sample {sample_id} was deleted before its images'
+                    ' were created')
+        return None
+    return statuses[sample_id]
+
+
+def _job_timeout(image_types: List[str]) -> int:
+    """
+    Returns the number of seconds a job creating images of the given
+    types can run before rq stops it.
+    """
+    return sum(env.IMAGE_JOB_TIMEOUT_3D if image_type == '3D'
+               else env.IMAGE_JOB_TIMEOUT_2D
+               for image_type in image_types)
+
+
+def enqueue_create_images(sample_id: int, image_type: str) -> rq.job.Job:
     """
     Creates images for the data in data_url on a Redis Queue worker.
     :param sample_id: the database ID of the sample
+    :param image_type: the type of the images, which sets the job timeout
     :return: a redis queue Job
     """
-    return queue.enqueue(create_images, sample_id)
+    return queue.enqueue(create_images, sample_id,
+                         job_timeout=_job_timeout([image_type]))
+
+
+def enqueue_create_images_batches(
+        samples: List[Tuple[int, str]]) -> List[rq.job.Job]:
+    """
+    Creates images for the samples on Redis Queue workers, with one job
+    per env.IMAGE_BATCH_SIZE samples instead of one job per sample.
+    :param samples: the database ID and image type of each sample
+    :return: the redis queue Jobs
+    """
+    jobs = []
+    for i in range(0, len(samples), env.IMAGE_BATCH_SIZE):
+        batch = samples[i:i + env.IMAGE_BATCH_SIZE]
+        jobs.append(queue.enqueue(
+            create_images_batch,
+            [sample_id for sample_id, _ in batch],
+            job_timeout=_job_timeout([image_type for _, image_type in batch])
+        ))
+    return jobs
+
+
+def _rendition(image_info: Dict, size: Optional[int], image_format: str):
+    """
+    Returns the size and format of the smallest rendition of the image
+    that is at least size pixels, or (None, 'jpeg') for the original.
+    """
+    renditions = image_info.get('renditions')
+    if size is None or renditions is None:
+        return None, 'jpeg'
+    larger_sizes = [s for s in renditions['sizes'] if s >= size]
+    if not larger_sizes:
+        return None, 'jpeg'
+    if image_format not in renditions['formats']:
+        image_format = 'jpeg'
+    return min(larger_sizes), image_format
 
 
-def get_images(info, limit, offset):
-    if 'image' in info:
+def get_images(info,
+               limit,
+               offset,
+               size: Optional[int] = None,
+               image_format: str = 'jpeg'):
+    """
+    Returns signed URLs of the images of the sample. Images which are
+    not CREATED are left out, apart from those stored in the data.
+
+    :param size: if given, smaller renditions of the images which are at
+        least this many pixels wide or high are returned when they exist
+    :param image_format: the format of the renditions, 'jpeg' or 'webp'.
+        JPEG renditions are returned if the format was not created.
+    """
+    if 'image' in info and info['image']['type'] == 'FROM_DATA':
+        rendition_size, rendition_format = _rendition(info['image'],
+                                                      size,
+                                                      image_format)
+        if rendition_size is None:
+            # The full size image is the data itself
+            url = info['data']['url']
+        else:
+            url = _image_url(info['image']['url'],
+                             rendition_size,
+                             rendition_format)
+        storage_client = storage.get_storage_client(url)
+        images = [storage_client.get_signed_url(url)]
+    elif 'image' in info:
         image_info: Dict = info['image']
+        if image_info['status'] != 'CREATED':
+            # Signed URLs of images which are still being created, or
+            # which failed, would only show up as broken images
+            return []
         image_url_prefix = image_info['url']
         image_type = image_info['type']
         storage_client = storage.get_storage_client(image_url_prefix)
+        rendition_size, rendition_format = _rendition(image_info,
+                                                      size,
+                                                      image_format)
         if image_type == '2D':
             images = [
-                storage_client.get_signed_url(f'{image_url_prefix}.jpg')
+                storage_client.get_signed_url(
+                    _image_url(image_url_prefix,
+                               rendition_size,
+                               rendition_format))
             ]
         elif image_type == '3D':
             if limit is None:
@@ -170,13 +469,17 @@ def get_images(info, limit, offset):
             else:
                 upper_bound = min(image_info['count'], offset + limit)
             images = [
-                storage_client.get_signed_url(f'{image_url_prefix}-{i}.jpg')
+                storage_client.get_signed_url(
+                    _image_url(f'{image_url_prefix}-{i}',
+                               rendition_size,
+                               rendition_format))
                 for i in range(offset, upper_bound)
             ]
         else:
             raise ValueError(f"Unsupported image_type '{image_type}'")
     elif any([info['data']['url'].lower().endswith(ext)
               for ext in ('.png', '.jpg', '.jpeg')]):
+        # Images in the data are served as they are, in full size
         storage_client = storage.get_storage_client(info['data']['url'])
         public_image_url = storage_client.get_signed_url(info['data']['url'])
         images = [public_image_url]
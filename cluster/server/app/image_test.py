@@ -1,9 +1,43 @@
 import io
+import json
 
 import numpy
 import pytest
+import rq.timeouts
+from PIL import Image
 
-from app import app, env, image, storage
+from app import app, db, env, image, storage
+
+
+def test_normalize():
+    volume = numpy.stack([
+        numpy.full((4, 4), 7.0),  # A constant slice
+        numpy.arange(16).reshape((4, 4)),
+        2 * numpy.arange(16).reshape((4, 4)),
+    ])
+
+    per_slice = image._normalize(volume, per_slice=True)
+    assert per_slice.dtype == numpy.uint8
+    assert (per_slice[0] == 0).all()
+    assert per_slice[1].min() == 0 and per_slice[1].max() == 255
+    assert (per_slice[1] == per_slice[2]).all()
+
+    scaled = image._normalize(volume)
+    assert scaled.min() == 0 and scaled.max() == 255
+    assert scaled[1].max() == int(255 * 15 / 30)
+    assert (scaled[2] == per_slice[2]).all()
+
+    # Slices are normalized in blocks
+    big_volume = numpy.random.rand(image.NORMALIZE_BLOCK_SIZE * 2 + 1, 3, 3)
+    expected = numpy.stack([
+        (255 * (s - s.min()) / (s.max() - s.min())).astype(numpy.uint8)
+        for s in big_volume
+    ])
+    difference = image._normalize(big_volume, per_slice=True).astype(int) \
+        - expected
+    assert numpy.abs(difference).max() <= 1
+
+    assert (image._normalize(numpy.zeros((2, 2))) == 0).all()
 
 
 def test_create_images_2d_npy_3_channels():
@@ -96,6 +130,40 @@ def test_create_images_3d_npy():
     assert not client.exists(f'{image_url}-{5}.jpg')
 
 
+def test_create_images_3d_npy_threads(monkeypatch):
+    monkeypatch.setattr(env, 'IMAGE_SLICE_THREADS', 4)
+    arr = numpy.random.rand(20, 5, 5)
+    stream = io.BytesIO()
+    numpy.save(stream, arr)
+    stream.seek(0)
+
+    image_url = 'temp://3d-array-threads'
+    data_url = 'temp://3d-array-threads.npy'
+
+    client = storage.get_storage_client(data_url)
+    client.put(data_url, stream)
+
+    assert image._create_images('3D', image_url, data_url) == 20
+    for i in range(20):
+        assert client.exists(f'{image_url}-{i}.jpg')
+
+
+def test_create_images_3d_npy_threads_error(monkeypatch):
+    monkeypatch.setattr(env, 'IMAGE_SLICE_THREADS', 2)
+    calls = []
+
+    def fail(img, image_url_base):
+        calls.append(image_url_base)
+        raise ValueError('upload failed')
+
+    monkeypatch.setattr(image, '_upload_image', fail)
+    volume = numpy.zeros((50, 5, 5), dtype=numpy.uint8)
+    with pytest.raises(ValueError):
+        image._upload_slices(volume, 'temp://3d-array-error')
+    # The queued slices are cancelled after the first error
+    assert len(calls) <= 2 * env.IMAGE_SLICE_THREADS
+
+
 def test_create_images_3d_npz():
     # npz files are no longer supported
     arr_0 = numpy.zeros((5, 5, 9))
@@ -116,6 +184,90 @@ def test_create_images_3d_npz():
         image._create_images(image_type, image_url, data_url)
 
 
+def test_create_images_renditions():
+    arr = numpy.arange(600 * 300).reshape((600, 300))
+    stream = io.BytesIO()
+    numpy.save(stream, arr)
+    stream.seek(0)
+
+    image_url = 'temp://2d-renditions'
+    data_url = 'temp://2d-renditions.npy'
+    client = storage.get_storage_client(data_url)
+    client.put(data_url, stream)
+
+    image._create_images('2D', image_url, data_url)
+    for size in env.IMAGE_RENDITION_SIZES:
+        for image_format in env.IMAGE_RENDITION_FORMATS:
+            url = image._image_url(image_url, size, image_format)
+            rendition = Image.open(client.get(url))
+            assert rendition.format == image_format.upper()
+            assert max(rendition.size) == size
+
+
+def test_get_images_size():
+    info = {
+        'data': {
+            'url': 'temp://2d-array.npy',
+        },
+        'image': {
+            'url': 'temp://2d-array',
+            'type': '2D',
+            'status': 'CREATED',
+            'renditions': {
+                'sizes': [128, 512],
+                'formats': ['jpeg'],
+            },
+        },
+    }
+    assert image.get_images(info, 1, 0) == ['temp://2d-array.jpg']
+    assert image.get_images(info, 1, 0, size=100) == [
+        'temp://2d-array@128.jpg']
+    assert image.get_images(info, 1, 0, size=200) == [
+        'temp://2d-array@512.jpg']
+    # Larger sizes and missing formats fall back to what exists
+    assert image.get_images(info, 1, 0, size=1000) == [
+        'temp://2d-array.jpg']
+    assert image.get_images(info, 1, 0, 100, 'webp') == [
+        'temp://2d-array@128.jpg']
+
+    # Images created before renditions were added
+    del info['image']['renditions']
+    assert image.get_images(info, 1, 0, size=100) == [
+        'temp://2d-array.jpg']
+
+    # Images which are not created yet are left out
+    info['image']['status'] = 'CREATING'
+    assert image.get_images(info, 1, 0) == []
+
+
+def test_get_images_from_data():
+    data_url = 'temp://blueno/from-data.png'
+    stream = io.BytesIO()
+    Image.new('RGB', (600, 300)).save(stream, format='png')
+    stream.seek(0)
+    storage.get_storage_client(data_url).put(data_url, stream)
+
+    image_info = {
+        'url': 'temp://images/from-data',
+        'type': 'FROM_DATA',
+        'status': 'CREATING',
+    }
+    image._create_sample_images(image_info, data_url)
+    assert image_info['status'] == 'CREATED'
+    client = storage.get_storage_client('temp://')
+    # The full size image is the data, so only renditions are created
+    assert not client.exists('temp://images/from-data.jpg')
+    assert client.exists('temp://images/from-data@128.jpg')
+
+    info = {
+        'data': {'url': data_url},
+        'image': image_info,
+    }
+    assert image.get_images(info, 1, 0) == [data_url]
+    assert image.get_images(info, 1, 0, size=100) == [
+        'temp://images/from-data@128.jpg']
+
+
 def test_get_images_jpg():
     stream = io.BytesIO(b'some bytes that should represent a JPG file')
     stream.seek(0)
@@ -142,6 +294,7 @@ def test_get_images_gcs1():
         'image': {
             'url': image_url,
             'type': image_type,
+            'status': 'CREATED',
         }
     }
 
@@ -160,6 +313,7 @@ def test_get_images_gcs2():
         'image': {
             'url': image_url,
             'type': image_type,
+            'status': 'CREATED',
             'count': 16,
         }
     }
@@ -185,6 +339,7 @@ def test_get_images_azure1():
         'image': {
             'url': image_url,
             'type': image_type,
+            'status': 'CREATED',
             'count': arr.shape[0],
         }
     }
@@ -215,6 +370,7 @@ def test_get_images_azure2():
         'image': {
             'url': image_url,
             'type': image_type,
+            'status': 'CREATED',
             'count': arr.shape[0],
         }
     }
@@ -243,6 +399,7 @@ def test_get_images_filesystem():
         'image': {
             'url': image_url,
             'type': image_type,
+            'status': 'CREATED',
             'count': arr.shape[0],
         }
     }
@@ -258,3 +415,124 @@ def test_get_images_filesystem():
     assert len(urls) == 10
     assert urls[0].startswith(
         'http://www.example.com/data/download?url=file://blueno/3d-array')
+
+
+def test_create_images_batch(test_user):
+    client = storage.get_storage_client('temp://')
+    data_url = 'temp://batch-array.npy'
+    stream = io.BytesIO()
+    numpy.save(stream, numpy.arange(25).reshape((5, 5)))
+    stream.seek(0)
+    client.put(data_url, stream)
+
+    infos = [
+        {
+            'data': {'url': data_url},
+            'image': {'url': 'temp://batch-image', 'type': '2D',
+                      'status': 'CREATING'},
+            'label': 'kept',
+        },
+        {
+            'data': {'url': 'temp://missing.npy'},
+            'image': {'url': 'temp://missing-image', 'type': '2D',
+                      'status': 'CREATING'},
+        },
+    ]
+    with db.pooled_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO datasets (name, created_at)
+                VALUES ('test_create_images_batch', now())
+                RETURNING id;
+                """)
+            dataset_id = cur.fetchone()[0]
+            sample_ids = []
+            for i, info in enumerate(infos):
+                cur.execute(
+                    """
+                    INSERT INTO samples (name, info, dataset_id,
+                                         created_at, last_updated)
+                    VALUES (%s, %s, %s, now(), now())
+                    RETURNING id;
+                    """,
+                    (f'sample{i}', json.dumps(info), dataset_id))
+                sample_ids.append(cur.fetchone()[0])
+        conn.commit()
+
+    # Deleted samples are skipped
+    statuses = image.create_images_batch(sample_ids + [-1])
+    assert statuses == {
+        sample_ids[0]: 'CREATED',
+        sample_ids[1]: 'FAILED',
+    }
+    assert client.exists('temp://batch-image.jpg')
+
+    with db.pooled_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute('SELECT info FROM samples WHERE id = %s;',
+                        (sample_ids[0],))
+            info = cur.fetchone()[0]
+            cur.execute('DELETE FROM samples WHERE dataset_id = %s;',
+                        (dataset_id,))
+            cur.execute('DELETE FROM datasets WHERE id = %s;',
+                        (dataset_id,))
+        conn.commit()
+    assert info['image']['count'] == 1
+    assert info['label'] == 'kept'
+
+
+def test_create_images_batch_timeout(test_user, monkeypatch):
+    def timeout(image_info, data_url):
+        raise rq.timeouts.JobTimeoutException('Job exceeded timeout')
+
+    monkeypatch.setattr(image, '_create_sample_images', timeout)
+    info = {
+        'data': {'url': 'temp://timeout.npy'},
+        'image': {'url': 'temp://timeout-image', 'type': '3D',
+                  'status': 'CREATING'},
+    }
+    with db.pooled_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO datasets (name, created_at)
+                VALUES ('test_create_images_batch_timeout', now())
+                RETURNING id;
+                """)
+            dataset_id = cur.fetchone()[0]
+            cur.execute(
+                """
+                INSERT INTO samples (name, info, dataset_id,
+                                     created_at, last_updated)
+                VALUES ('sample', %s, %s, now(), now())
+                RETURNING id;
+                """,
+                (json.dumps(info), dataset_id))
+            sample_id = cur.fetchone()[0]
+        conn.commit()
+
+    with pytest.raises(rq.timeouts.JobTimeoutException):
+        image.create_images_batch([sample_id])
+
+    with db.pooled_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute('SELECT info FROM samples WHERE id = %s;',
+                        (sample_id,))
+            info = cur.fetchone()[0]
+            cur.execute('DELETE FROM samples WHERE dataset_id = %s;',
+                        (dataset_id,))
+            cur.execute('DELETE FROM datasets WHERE id = %s;',
+                        (dataset_id,))
+        conn.commit()
+    assert info['image']['status'] == 'FAILED'
+
+
+def test_create_images_deleted_sample(test_user):
+    assert image.create_images(-1) is None
+
+
+def test_job_timeout(monkeypatch):
+    monkeypatch.setattr(env, 'IMAGE_JOB_TIMEOUT_2D', 10)
+    monkeypatch.setattr(env, 'IMAGE_JOB_TIMEOUT_3D', 100)
+    assert image._job_timeout(['2D', '2D', '3D']) == 120
@@ -0,0 +1,3 @@
+/* Listings filter on dataset_id and page through the samples by id */
+CREATE INDEX IF NOT EXISTS samples_dataset_id_id_idx
+    ON samples (dataset_id, id);
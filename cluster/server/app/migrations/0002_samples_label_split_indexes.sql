@@ -0,0 +1,6 @@
+/* Used by the label and split filters of the listings */
+CREATE INDEX IF NOT EXISTS samples_label_idx
+    ON samples (dataset_id, (info ->> 'label'), id);
+
+CREATE INDEX IF NOT EXISTS samples_split_idx
+    ON samples (dataset_id, (info ->> 'split'), id);
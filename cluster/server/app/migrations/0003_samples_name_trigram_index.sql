@@ -0,0 +1,6 @@
+/* Trigram indexes can be used by the case-insensitive
+   name ILIKE 'prefix%' searches of the listings */
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS samples_name_trgm_idx
+    ON samples USING gin (name gin_trgm_ops);
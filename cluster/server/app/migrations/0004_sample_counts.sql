@@ -0,0 +1,102 @@
+/* Per-dataset sample counts broken down by split and label so that
+   counting doesn't scan the samples of a dataset. Missing splits and
+   labels are counted under ''. */
+CREATE TABLE IF NOT EXISTS sample_counts
+(
+    dataset_id INT REFERENCES datasets (id) ON DELETE CASCADE NOT NULL,
+    split      text                                           NOT NULL,
+    label      text                                           NOT NULL,
+
+    count      BIGINT                                         NOT NULL,
+
+    PRIMARY KEY (dataset_id, split, label)
+);
+
+/* Statement-level triggers update each counter once per statement,
+   so bulk inserts don't update the same counter row per sample */
+CREATE OR REPLACE FUNCTION update_sample_counts() RETURNS trigger AS
+$$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO sample_counts (dataset_id, split, label, count)
+        SELECT dataset_id,
+               COALESCE(info ->> 'split', ''),
+               COALESCE(info ->> 'label', ''),
+               count(*)
+        FROM new_rows
+        GROUP BY 1, 2, 3
+        ON CONFLICT (dataset_id, split, label)
+            DO UPDATE SET count = sample_counts.count + EXCLUDED.count;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE sample_counts AS c
+        SET count = c.count - d.count
+        FROM (SELECT dataset_id,
+                     COALESCE(info ->> 'split', '') AS split,
+                     COALESCE(info ->> 'label', '') AS label,
+                     count(*)                       AS count
+              FROM old_rows
+              GROUP BY 1, 2, 3) AS d
+        WHERE c.dataset_id = d.dataset_id
+          AND c.split = d.split
+          AND c.label = d.label;
+    ELSIF TG_OP = 'UPDATE' THEN
+        /* Most updates (ex. image statuses) don't change the counters */
+        INSERT INTO sample_counts (dataset_id, split, label, count)
+        SELECT dataset_id, split, label, sum(delta)
+        FROM (SELECT dataset_id,
+                     COALESCE(info ->> 'split', ''),
+                     COALESCE(info ->> 'label', ''),
+                     1
+              FROM new_rows
+              UNION ALL
+              SELECT dataset_id,
+                     COALESCE(info ->> 'split', ''),
+                     COALESCE(info ->> 'label', ''),
+                     -1
+              FROM old_rows) AS d (dataset_id, split, label, delta)
+        GROUP BY 1, 2, 3
+        HAVING sum(delta) <> 0
+        ON CONFLICT (dataset_id, split, label)
+            DO UPDATE SET count = sample_counts.count + EXCLUDED.count;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+/* Block writes to samples until the counters are backfilled */
+LOCK TABLE samples IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS samples_insert_counts ON samples;
+CREATE TRIGGER samples_insert_counts
+    AFTER INSERT
+    ON samples
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+EXECUTE PROCEDURE update_sample_counts();
+
+DROP TRIGGER IF EXISTS samples_delete_counts ON samples;
+CREATE TRIGGER samples_delete_counts
+    AFTER DELETE
+    ON samples
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+EXECUTE PROCEDURE update_sample_counts();
+
+DROP TRIGGER IF EXISTS samples_update_counts ON samples;
+CREATE TRIGGER samples_update_counts
+    AFTER UPDATE
+    ON samples
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+EXECUTE PROCEDURE update_sample_counts();
+
+DELETE
+FROM sample_counts;
+
+INSERT INTO sample_counts (dataset_id, split, label, count)
+SELECT dataset_id,
+       COALESCE(info ->> 'split', ''),
+       COALESCE(info ->> 'label', ''),
+       count(*)
+FROM samples
+GROUP BY 1, 2, 3;
@@ -1,7 +1,10 @@
+import urllib.parse
+
 import flask
 import flask_jwt_extended
+import werkzeug.datastructures
 
-from app import storage
+from app import env, storage
 
 data_bp = flask.Blueprint('data', __name__)
 
@@ -28,6 +31,48 @@ def upload_object():
     return flask.jsonify({})
 
 
+@data_bp.route('/data/objects',
+               methods=['PUT'])
+@flask_jwt_extended.jwt_required
+def put_object():
+    """
+    Saves the raw request body at the url query param.
+
+    Unlike /data/upload, the body is not parsed as a form. It is passed
+    to the store as a stream which is read in chunks as it arrives.
+    """
+    object_url = flask.request.args.get('url', None)
+    if object_url is None:
+        return flask.jsonify({'message': "No url query param found"}), 400
+    try:
+        storage_client = storage.get_storage_client(object_url)
+    except ValueError as e:
+        return flask.jsonify({'message': str(e)}), 400
+    storage_client.put(object_url, flask.request.stream)
+
+    return flask.jsonify({})
+
+
+@data_bp.route('/data/upload_url',
+               methods=['GET'])
+@flask_jwt_extended.jwt_required
+def get_upload_url():
+    """
+    Returns a signed request which uploads the object straight to its
+    store, or None if the object has to be uploaded to /data/upload.
+    """
+    object_url = flask.request.args.get('url', None)
+    if object_url is None:
+        return flask.jsonify({'message': "No url query param found"}), 400
+    try:
+        storage_client = storage.get_storage_client(object_url)
+    except ValueError as e:
+        return flask.jsonify({'message': str(e)}), 400
+    return flask.jsonify({
+        'upload': storage_client.get_signed_upload_url(object_url),
+    })
+
+
 @data_bp.route('/data/download',
                methods=['GET'])
 def download_object():
@@ -38,7 +83,71 @@ def download_object():
         storage_client = storage.get_storage_client(object_url)
     except ValueError as e:
         return flask.jsonify({'message': str(e)}), 400
-    stream = storage_client.get(object_url)
-    return flask.send_file(stream,
-                           mimetype='application/octet-stream',
-                           attachment_filename=object_url)
+
+    is_file = isinstance(storage_client, storage.clients.FilesystemStore)
+    if is_file and env.FILESYSTEM_ACCEL_REDIRECT_PREFIX is not None:
+        return _accel_redirect(storage_client, object_url)
+
+    # Checked before streaming, since an error raised while the body is
+    # sent can no longer change the status of the response
+    if not storage_client.exists(object_url):
+        return flask.jsonify({
+            'message': f"No object was found at '{object_url}'"}), 404
+
+    # Only single byte ranges are served, other Range headers are ignored
+    # and the whole object is sent instead
+    byte_range = flask.request.range
+    if byte_range is not None and len(byte_range.ranges) == 1:
+        return _download_range(storage_client, object_url, byte_range)
+
+    if is_file:
+        # Files are already read lazily and can be sent with sendfile()
+        stream = storage_client.get(object_url)
+        res = flask.send_file(stream,
+                              mimetype='application/octet-stream',
+                              attachment_filename=object_url)
+    else:
+        # Other objects are piped through chunk by chunk instead of being
+        # downloaded into memory first
+        size = storage_client.size(object_url)
+        res = flask.Response(storage_client.iter_chunks(object_url, end=size),
+                             mimetype='application/octet-stream')
+        res.content_length = size
+    res.headers['Accept-Ranges'] = 'bytes'
+    return res
+
+
+def _accel_redirect(storage_client: storage.clients.FilesystemStore,
+                    object_url: str):
+    """
+    Lets nginx send the file from its internal location, which also
+    handles Range requests, instead of a worker copying the bytes.
+    """
+    path = storage_client.get_path(object_url)
+    relative_path = path.relative_to(storage_client.root_path).as_posix()
+    res = flask.Response(mimetype='application/octet-stream')
+    res.headers['X-Accel-Redirect'] = urllib.parse.quote(
+        env.FILESYSTEM_ACCEL_REDIRECT_PREFIX + relative_path)
+    return res
+
+
+def _download_range(storage_client: storage.clients.DataStoreInterface,
+                    object_url: str,
+                    byte_range: werkzeug.datastructures.Range):
+    size = storage_client.size(object_url)
+    bounds = byte_range.range_for_length(size)
+    if bounds is None:
+        res = flask.Response(status=416)
+        res.headers['Content-Range'] = f'bytes */{size}'
+        return res
+
+    start, end = bounds
+    res = flask.Response(storage_client.iter_chunks(object_url,
+                                                    start=start,
+                                                    end=end),
+                         status=206,
+                         mimetype='application/octet-stream')
+    res.headers['Accept-Ranges'] = 'bytes'
+    res.headers['Content-Range'] = f'bytes {start}-{end - 1}/{size}'
+    res.content_length = end - start
+    return res
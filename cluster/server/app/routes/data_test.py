@@ -41,3 +41,157 @@ def test_upload_download_object(test_user):
                                      headers=headers)
     assert res.status_code == 200
     assert res.data == file_content
+
+
+@pytest.mark.skipif(env.FILESYSTEM_STORE_ROOT is None,
+                    reason='Local filesystem store must be enabled')
+def test_download_object_range(test_user):
+    client = app.test_client()
+    res = client.post('/login', json={
+        'email': test_user[0],
+        'password': test_user[1],
+    })
+    assert res.status_code == 200
+    access_token = res.json['access_token']
+    headers = {
+        'Authorization': 'Bearer {}'.format(access_token)
+    }
+
+    file_url = 'file://blueno/test_download_object_range.txt'
+    file_content = b'0123456789'
+    res = client.post(f'/data/upload?url={file_url}',
+                      headers=headers,
+                      data={
+                          'file': (io.BytesIO(file_content), file_url),
+                      })
+    assert res.status_code == 200
+
+    res = client.get(f'/data/download?url={file_url}',
+                     headers={'Range': 'bytes=2-4'})
+    assert res.status_code == 206
+    assert res.data == b'234'
+    assert res.headers['Content-Range'] == 'bytes 2-4/10'
+
+    res = client.get(f'/data/download?url={file_url}',
+                     headers={'Range': 'bytes=-3'})
+    assert res.status_code == 206
+    assert res.data == b'789'
+
+    res = client.get(f'/data/download?url={file_url}',
+                     headers={'Range': 'bytes=20-30'})
+    assert res.status_code == 416
+    assert res.headers['Content-Range'] == 'bytes */10'
+
+
+@pytest.mark.skipif(env.FILESYSTEM_STORE_ROOT is None,
+                    reason='Local filesystem store must be enabled')
+def test_get_upload_url(test_user):
+    client = app.test_client()
+    res = client.post('/login', json={
+        'email': test_user[0],
+        'password': test_user[1],
+    })
+    assert res.status_code == 200
+    headers = {
+        'Authorization': 'Bearer {}'.format(res.json['access_token'])
+    }
+
+    # Files on the server can only be uploaded through /data/upload
+    res = client.get('/data/upload_url?url=file://blueno/test.txt',
+                     headers=headers)
+    assert res.status_code == 200
+    assert res.json['upload'] is None
+
+    res = client.get('/data/upload_url', headers=headers)
+    assert res.status_code == 400
+
+
+@pytest.mark.skipif(env.FILESYSTEM_STORE_ROOT is None,
+                    reason='Local filesystem store must be enabled')
+def test_put_object(test_user):
+    client = app.test_client()
+    res = client.post('/login', json={
+        'email': test_user[0],
+        'password': test_user[1],
+    })
+    assert res.status_code == 200
+    headers = {
+        'Authorization': 'Bearer {}'.format(res.json['access_token']),
+        'Content-Type': 'application/octet-stream',
+    }
+
+    file_url = 'file://blueno/test_put_object.bin'
+    file_content = bytes(range(256)) * 1024
+    res = client.put(f'/data/objects?url={file_url}',
+                     headers=headers,
+                     data=file_content)
+    assert res.status_code == 200
+
+    res = client.get(f'/data/download?url={file_url}')
+    assert res.status_code == 200
+    assert res.data == file_content
+
+    res = client.put('/data/objects', headers=headers, data=b'')
+    assert res.status_code == 400
+
+
+@pytest.mark.skipif(env.FILESYSTEM_STORE_ROOT is None,
+                    reason='Local filesystem store must be enabled')
+def test_put_download_packed_object(test_user):
+    client = app.test_client()
+    res = client.post('/login', json={
+        'email': test_user[0],
+        'password': test_user[1],
+    })
+    assert res.status_code == 200
+    headers = {
+        'Authorization': 'Bearer {}'.format(res.json['access_token']),
+        'Content-Type': 'application/octet-stream',
+    }
+
+    for i in range(3):
+        res = client.put(f'/data/objects?url=pack://blueno/packed/{i}.txt',
+                         headers=headers,
+                         data=f'object {i}'.encode())
+        assert res.status_code == 200
+
+    res = client.get('/data/download?url=pack://blueno/packed/1.txt')
+    assert res.status_code == 200
+    assert res.content_length == len(b'object 1')
+    assert res.data == b'object 1'
+
+    res = client.get('/data/download?url=pack://blueno/packed/2.txt',
+                     headers={'Range': 'bytes=-1'})
+    assert res.status_code == 206
+    assert res.data == b'2'
+
+    res = client.get('/data/download?url=pack://blueno/packed/missing.txt')
+    assert res.status_code == 404
+
+
+@pytest.mark.skipif(env.FILESYSTEM_STORE_ROOT is None,
+                    reason='Local filesystem store must be enabled')
+def test_download_object_accel_redirect(test_user, monkeypatch):
+    client = app.test_client()
+    res = client.post('/login', json={
+        'email': test_user[0],
+        'password': test_user[1],
+    })
+    assert res.status_code == 200
+    headers = {
+        'Authorization': 'Bearer {}'.format(res.json['access_token']),
+        'Content-Type': 'application/octet-stream',
+    }
+    file_url = 'file://blueno/test accel redirect.txt'
+    res = client.put(f'/data/objects?url={file_url}',
+                     headers=headers,
+                     data=b'served by nginx')
+    assert res.status_code == 200
+
+    monkeypatch.setattr(env, 'FILESYSTEM_ACCEL_REDIRECT_PREFIX',
+                        '/protected-files/')
+    res = client.get(f'/data/download?url={file_url}')
+    assert res.status_code == 200
+    assert res.data == b''
+    assert res.headers['X-Accel-Redirect'] == \
+        '/protected-files/blueno/test%20accel%20redirect.txt'
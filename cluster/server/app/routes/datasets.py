@@ -12,28 +12,39 @@ from app import db
 
 datasets_bp = flask.Blueprint('datasets', __name__)
 
+# Fields that can be selected with the fields param of list_datasets().
+# Subfields of info can be selected with dots (ex. info.description).
+DATASET_COLUMNS = {
+    'name': 'name',
+    'info': 'info',
+    'created_at': 'created_at',
+}
+DEFAULT_DATASET_FIELDS = 'name,info,created_at'
+
 
 @datasets_bp.route('/datasets/', methods=['GET'])
 @flask_jwt_extended.jwt_required
 def list_datasets():
+    fields = flask.request.args.get('fields', DEFAULT_DATASET_FIELDS)
+    try:
+        select_list, select_params, paths = db.select_fields(
+            fields, DATASET_COLUMNS, {'info'})
+    except ValueError as e:
+        return flask.jsonify({'message': str(e)}), 400
+
     conn = db.get_conn()
     with conn.cursor() as cur:
         cur.execute(
-            """
-            SELECT name, info, created_at
+            f"""
+            SELECT {select_list}
             FROM datasets
             ORDER BY name;
-            """
+            """,
+            select_params
         )
         results = cur.fetchall()
 
-    datasets = []
-    for name, info, created_at in results:
-        datasets.append({
-            'name': name,
-            'info': info,
-            'created_at': created_at
-        })
+    datasets = [db.project_row(row, paths) for row in results]
 
     return flask.jsonify({
         'datasets': datasets,
@@ -33,6 +33,11 @@ def test_all_simple(test_user):
         assert res.status_code == 200
         assert len(res.json['datasets']) == 1
 
+        res = client.get('/datasets/', headers=headers,
+                         query_string={'fields': 'name'})
+        assert res.status_code == 200
+        assert res.json['datasets'] == [{'name': dataset}]
+
         # 2nd create request should fail
         res = client.put(f'/datasets/{dataset}', headers=headers)
         assert res.status_code == 409
@@ -15,6 +15,16 @@ def list_sample_images(dataset_name):
     prefix = params.get('prefix', '')
     label = params.get('label', '')
     split = params.get('split', '')
+    cursor = params.get('cursor', None)
+    size = params.get('size', default=None, type=int)
+    image_format = params.get('format', default='jpeg')
+    try:
+        after_id = db.decode_cursor(cursor) if cursor else 0
+    except ValueError as e:
+        return flask.jsonify({'message': str(e)}), 400
+    if image_format not in image.EXTENSIONS:
+        return flask.jsonify({
+            'message': f"Unsupported image format '{image_format}'"}), 400
 
     # Duplication in samples.list_samples()
     conn = db.get_conn()
@@ -23,9 +33,10 @@ def list_sample_images(dataset_name):
         dataset_id = db.dataset_id(cur, dataset_name)
         cur.execute(
             """
-            SELECT s.info
+            SELECT s.id, s.info
             FROM samples AS s
             WHERE s.dataset_id = %s
+              AND s.id > %s
               AND s.name ILIKE %s
               AND (%s = '' OR s.info->>'label' = %s)
               AND (%s = '' OR s.info->>'split' = %s)
@@ -33,6 +44,7 @@ def list_sample_images(dataset_name):
             LIMIT %s OFFSET %s;
             """,
             (dataset_id,
+             after_id,
              prefix_pattern,
              label, label,
              split, split,
@@ -42,10 +54,10 @@ def list_sample_images(dataset_name):
 
     images = []
     for row in results:
-        info = row[0]
+        info = row[1]
         # TODO: inspect for other possible errors
         try:
-            image_urls = image.get_images(info, 1, 0)
+            image_urls = image.get_images(info, 1, 0, size, image_format)
         except KeyError:
             images.append(None)
         else:
@@ -56,6 +68,7 @@ def list_sample_images(dataset_name):
 
     return flask.jsonify({
         'images': images,
+        'next_cursor': db.next_cursor(results, limit),
     })
 
 
@@ -82,12 +95,53 @@ def get_sample_images(dataset_name, name):
     params = flask.request.args
     limit = params.get('limit', default=None, type=int)
     offset = params.get('offset', default=0, type=int)
+    size = params.get('size', default=None, type=int)
+    image_format = params.get('format', default='jpeg')
+    if image_format not in image.EXTENSIONS:
+        return flask.jsonify({
+            'message': f"Unsupported image format '{image_format}'"}), 400
 
     try:
-        images = image.get_images(info, limit, offset)
+        images = image.get_images(info, limit, offset, size, image_format)
     except KeyError:
         images = []
 
     return flask.jsonify({
         'images': images,
     })
+
+
+@sample_images_bp.route(
+    '/datasets/<dataset_name>/samples/<name>/images/status')
+@flask_jwt_extended.jwt_required
+def get_sample_image_status(dataset_name, name):
+    """
+    Returns the status of the images of the sample, so that clients can
+    poll for images which are created by a worker.
+
+    The status is 'CREATING', 'CREATED' or 'FAILED'.
+    """
+    conn = db.get_conn()
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT s.info->'image'
+            FROM samples AS s
+            JOIN datasets AS d
+            ON s.dataset_id = d.id
+            WHERE s.name = %s AND d.name = %s;
+            """,
+            (name, dataset_name)
+        )
+        row = cur.fetchone()
+    if row is None:
+        raise db.NotFoundException(f"Could not find sample '{name}'")
+    image_info = row[0]
+    if image_info is None:
+        raise db.NotFoundException(f"Sample '{name}' has no images")
+
+    return flask.jsonify({
+        'status': image_info['status'],
+        'reason': image_info.get('reason'),
+        'count': image_info.get('count'),
+    })
@@ -159,3 +159,120 @@ def test_get_sample_images(test_user):
     res = client.delete(f'/datasets/{dataset}',
                         headers=headers)
     assert res.status_code == 200
+
+
+@pytest.mark.skipif(env.FILESYSTEM_STORE_ROOT is None,
+                    reason='Local filesystem store must be enabled')
+def test_get_sample_image_status(test_user):
+    dataset = 'sample_images_test::test_get_sample_image_status-dataset'
+    sample = 'sample_images_test::test_get_sample_image_status-sample'
+    client = app.test_client()
+
+    res = client.post('/login', json={
+        'email': test_user[0],
+        'password': test_user[1],
+    })
+    assert res.status_code == 200
+    headers = {
+        'Authorization': 'Bearer {}'.format(res.json['access_token'])
+    }
+    res = client.put(f'/datasets/{dataset}', headers=headers)
+    assert res.status_code == 200
+
+    data_url = f'file://blueno/{sample}.npy'
+    stream = io.BytesIO()
+    numpy.save(stream, numpy.arange(25).reshape((5, 5)))
+    res = client.put(f'/data/objects?url={data_url}',
+                     headers=headers,
+                     data=stream.getvalue())
+    assert res.status_code == 200
+
+    # Images are only created in the request when asked to wait for them
+    res = client.put(f'/datasets/{dataset}/samples/{sample}',
+                     headers=headers,
+                     json={
+                         'info': {
+                             'data': {
+                                 'url': data_url,
+                             },
+                             'image': {
+                                 'type': '2D',
+                             },
+                         },
+                         'wait_for_images': True,
+                     })
+    assert res.status_code == 200
+    assert res.json['image_status'] == 'CREATED'
+
+    res = client.get(f'/datasets/{dataset}/samples/{sample}/images/status',
+                     headers=headers)
+    assert res.status_code == 200
+    assert res.json['status'] == 'CREATED'
+    assert res.json['count'] == 1
+
+    res = client.get(f'/datasets/{dataset}/samples/missing/images/status',
+                     headers=headers)
+    assert res.status_code == 404
+
+    res = client.delete(f'/datasets/{dataset}/samples/{sample}',
+                        headers=headers)
+    assert res.status_code == 200
+    res = client.delete(f'/datasets/{dataset}', headers=headers)
+    assert res.status_code == 200
+
+
+@pytest.mark.skipif(env.FILESYSTEM_STORE_ROOT is None,
+                    reason='Local filesystem store must be enabled')
+def test_packed_sample_images(test_user):
+    dataset = 'sample_images_test::test_packed_sample_images-dataset'
+    sample = 'sample_images_test::test_packed_sample_images-sample'
+    client = app.test_client()
+
+    res = client.post('/login', json={
+        'email': test_user[0],
+        'password': test_user[1],
+    })
+    assert res.status_code == 200
+    headers = {
+        'Authorization': 'Bearer {}'.format(res.json['access_token'])
+    }
+    res = client.put(f'/datasets/{dataset}', headers=headers)
+    assert res.status_code == 200
+
+    data_url = f'pack://blueno/{sample}.npy'
+    stream = io.BytesIO()
+    numpy.save(stream, numpy.arange(25).reshape((5, 5)))
+    res = client.put(f'/data/objects?url={data_url}',
+                     headers=headers,
+                     data=stream.getvalue())
+    assert res.status_code == 200
+
+    res = client.put(f'/datasets/{dataset}/samples/{sample}',
+                     headers=headers,
+                     json={
+                         'info': {
+                             'data': {
+                                 'url': data_url,
+                             },
+                             'image': {
+                                 'type': '2D',
+                             },
+                         },
+                         'wait_for_images': True,
+                     })
+    assert res.status_code == 200
+    assert res.json['image_status'] == 'CREATED'
+
+    # The images of packed data are packed too
+    res = client.get(f'/datasets/{dataset}/samples/{sample}/images',
+                     headers=headers)
+    assert res.status_code == 200
+    image_url = f'pack://images/{dataset}/{sample}.jpg'
+    expected_url = f'http://localhost/data/download?url={image_url}'
+    assert res.json['images'] == [expected_url]
+
+    res = client.delete(f'/datasets/{dataset}/samples/{sample}',
+                        headers=headers)
+    assert res.status_code == 200
+    res = client.delete(f'/datasets/{dataset}', headers=headers)
+    assert res.status_code == 200
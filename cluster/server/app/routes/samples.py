@@ -3,17 +3,33 @@ Routes for handling individual samples.
 """
 import datetime
 import json
-from typing import Dict
+from typing import Dict, Iterable, Iterator, Optional
 
 import flask
 import flask_jwt_extended
 import psycopg2
+import psycopg2.extras
 
 from app import db, storage, env
 from app import image
 
 samples_bp = flask.Blueprint('samples', __name__)
 
+# The maximum number of samples accepted by register_samples()
+MAX_BATCH_SIZE = 10000
+# Streamed listings are fetched from the database this many rows at a time
+STREAM_CHUNK_SIZE = 1000
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# Fields that can be selected with the fields param of list_samples().
+# Subfields of info can be selected with dots (ex. info.label).
+SAMPLE_COLUMNS = {
+    'name': 's.name',
+    'info': 's.info',
+    'created_at': 's.created_at',
+    'last_updated': 's.last_updated',
+}
+DEFAULT_SAMPLE_FIELDS = 'name,info,created_at,last_updated'
+
 
 @samples_bp.route('/datasets/<dataset_name>/samples/')
 @flask_jwt_extended.jwt_required
@@ -25,6 +41,14 @@ def list_samples(dataset_name):
     prefix = params.get('prefix', '')
     label = params.get('label', '')
     split = params.get('split', '')
+    cursor = params.get('cursor', None)
+    fields = params.get('fields', DEFAULT_SAMPLE_FIELDS)
+    try:
+        after_id = db.decode_cursor(cursor) if cursor else 0
+        select_list, select_params, paths = db.select_fields(
+            fields, SAMPLE_COLUMNS, {'info'})
+    except ValueError as e:
+        return flask.jsonify({'message': str(e)}), 400
 
     # 2. Query the database
     # Duplication in sample_images
@@ -35,57 +59,84 @@ def list_samples(dataset_name):
         # 2-5 seconds to less than 20 ms
         dataset_id = db.dataset_id(cur, dataset_name)
 
-        cur.execute(
-            """
-            SELECT s.name, s.info, s.created_at, s.last_updated
-            FROM samples AS s
-            WHERE s.dataset_id = %s
-              AND s.name ILIKE %s
-              AND (%s = '' OR s.info->>'label' = %s)
-              AND (%s = '' OR s.info->>'split' = %s)
-            ORDER BY s.id
-            LIMIT %s OFFSET %s;
-            """,
-            (dataset_id,
-             prefix_pattern,
-             label, label,
-             split, split,
-             limit, offset)
-        )
+    # Resuming from the cursor's id (keyset pagination) avoids scanning
+    # the rows of the previous pages like OFFSET does
+    query = f"""
+        SELECT s.id, {select_list}
+        FROM samples AS s
+        WHERE s.dataset_id = %s
+          AND s.id > %s
+          AND s.name ILIKE %s
+          AND (%s = '' OR s.info->>'label' = %s)
+          AND (%s = '' OR s.info->>'split' = %s)
+        ORDER BY s.id
+        LIMIT %s OFFSET %s;
+        """
+    query_params = select_params + (dataset_id,
+                                    after_id,
+                                    prefix_pattern,
+                                    label, label,
+                                    split, split,
+                                    limit, offset)
+
+    if _accepts_ndjson():
+        rows = db.stream_rows(query, query_params, STREAM_CHUNK_SIZE)
+        return flask.Response(_encode_ndjson(db.project_row(row[1:], paths)
+                                             for row in rows),
+                              mimetype=NDJSON_MIMETYPE)
+
+    with conn.cursor() as cur:
+        cur.execute(query, query_params)
         results = cur.fetchall()
 
-    samples = []
-    for row in results:
-        samples.append({
-            'name': row[0],
-            'info': row[1],
-            'created_at': row[2],
-            'last_updated': row[3],
-        })
+    samples = [db.project_row(row[1:], paths) for row in results]
 
     return flask.jsonify({
         'samples': samples,
+        'next_cursor': db.next_cursor(results, limit),
     })
 
 
+def _accepts_ndjson() -> bool:
+    # Clients usually also accept */*, so NDJSON has to be preferred
+    best = flask.request.accept_mimetypes.best_match(['application/json',
+                                                      NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+
+def _encode_ndjson(objects: Iterable) -> Iterator[str]:
+    """
+    Encodes each object as a line of JSON, as it is consumed.
+    """
+    for obj in objects:
+        yield flask.json.dumps(obj) + '\n'
+
+
 @samples_bp.route('/datasets/<dataset_name>/samples/count')
 @flask_jwt_extended.jwt_required
 def count_samples(dataset_name):
+    params = flask.request.args
+    label = params.get('label', '')
+    split = params.get('split', '')
+
     conn = db.get_conn()
     with conn.cursor() as cur:
+        dataset_id = db.dataset_id(cur, dataset_name)
+        # Performance note: sample_counts is maintained by triggers on
+        # samples so this doesn't scan the samples of the dataset
         cur.execute(
             """
-            SELECT count(*)
-            FROM samples AS s
-            JOIN datasets AS d
-            ON s.dataset_id = d.id
-            WHERE d.name = %s;
+            SELECT COALESCE(sum(c.count), 0)
+            FROM sample_counts AS c
+            WHERE c.dataset_id = %s
+              AND (%s = '' OR c.label = %s)
+              AND (%s = '' OR c.split = %s);
             """,
-            (dataset_name,)
+            (dataset_id,
+             label, label,
+             split, split)
         )
         result = cur.fetchone()
-    if result is None:
-        raise db.NotFoundException(f"Dataset '{dataset_name}' was not found")
 
     count = int(result[0])
     return flask.jsonify({
@@ -93,97 +144,114 @@ def count_samples(dataset_name):
     })
 
 
-@samples_bp.route('/datasets/<dataset_name>/samples/<name>', methods=['PUT'])
-@flask_jwt_extended.jwt_required
-def register_sample(dataset_name, name):
-    # 1. Validate the payload
-    payload = flask.request.get_json()
-
-    if payload is None:
-        return flask.jsonify({
-            'message': 'No JSON payload found. Cannot register the sample'
-        }), 400
-
-    info = payload.get('info', None)
+def _prepare_info(dataset_name: str,
+                  name: str,
+                  info: Optional[Dict],
+                  validate: bool) -> Optional[str]:
+    """
+    Validates the info of a sample to register and fills in the
+    image fields.
 
+    :return: an error message if the sample cannot be registered,
+        otherwise None
+    """
+    # 1. Validate the info object
     if info is None:
-        return flask.jsonify({
-            'message': 'No info object found. Cannot register the sample'
-        }), 400
+        return 'No info object found. Cannot register the sample'
     if 'data' not in info:
-        return flask.jsonify({
-            'message': 'No data field found in info.'
-                       ' Cannot register the sample.'
-        }), 400
+        return 'No data field found in info. Cannot register the sample.'
     if 'url' not in info['data']:
-        return flask.jsonify({
-            'message': 'No url field found in info["data"].'
-                       ' Cannot register the sample.'
-        }), 400
+        return ('No url field found in info["data"].'
+                ' Cannot register the sample.')
 
     # 2. Check whether the sample exists at the given data_url
     data_url: str = info['data']['url']
 
-    if payload.get('validate', True):
+    if validate:
         try:
             client = storage.get_storage_client(
                 data_url)
         except ValueError:
-            return flask.jsonify({
-                'message': f'Cannot find valid storage client for {data_url}.'
-                ' Validation failed.'
-            }), 400
+            return (f'Cannot find valid storage client for {data_url}.'
+                    ' Validation failed.')
         if not client.exists(data_url):
-            return flask.jsonify({
-                'message': f'No data was found at info["data"]={data_url}.'
-                ' Validation failed.'
-            }), 400
+            return (f'No data was found at info["data"]={data_url}.'
+                    ' Validation failed.')
 
     # 3. Update info['info']
     if 'image' in info:
         image_type = info['image'].get('type', None)
         if image_type is None:
-            return flask.jsonify({
-                'message': 'No type field found in info["image"].'
-                           ' Cannot make an image of the sample.'
-            }), 400
+            return ('No type field found in info["image"].'
+                    ' Cannot make an image of the sample.')
         # TODO: Allow users to define their own image url root through the
         #  admin page
         if env.FILESYSTEM_STORE_ROOT is None:
-            return flask.jsonify({
-                'message': 'Filesystem store not enabled, not creating images.'
-            }), 400
-        image_url = f'file://images/{dataset_name}/{name}'
+            return 'Filesystem store not enabled, not creating images.'
+        if data_url.startswith(storage.clients.PACK_PREFIX):
+            # The renditions would otherwise add several files per sample
+            image_url = f'pack://images/{dataset_name}/{name}'
+        else:
+            image_url = f'file://images/{dataset_name}/{name}'
         info['image']['url'] = image_url
         info['image']['status'] = 'CREATING'
         # We create the images once we know the sample ID
     elif data_url.startswith((storage.clients.AZURE_PREFIX,
                               storage.clients.GCS_PREFIX)) \
             and data_url.lower().endswith(('.png', '.jpg', '.jpeg')):
-        info['image'] = {
-            'url': data_url,
-            'type': 'FROM_DATA',
-            'status': 'CREATED',
-        }
+        if env.FILESYSTEM_STORE_ROOT is None:
+            # Only the full size image in the data can be served
+            info['image'] = {
+                'url': data_url,
+                'type': 'FROM_DATA',
+                'status': 'CREATED',
+            }
+        else:
+            # The image is the data but its renditions are made like
+            # those of the other images
+            info['image'] = {
+                'url': f'file://images/{dataset_name}/{name}',
+                'type': 'FROM_DATA',
+                'status': 'CREATING',
+            }
+    return None
 
-    # 4. Register the sample in the database
+
+def _needs_images(info: Dict) -> bool:
+    return ('image' in info
+            and info['image']['status'] == 'CREATING'
+            and (info['image']['type'] == 'FROM_DATA'
+                 or info['data']['url'].startswith(
+                    (storage.clients.FILESYSTEM_PREFIX,
+                     storage.clients.PACK_PREFIX))))
+
+
+@samples_bp.route('/datasets/<dataset_name>/samples/<name>', methods=['PUT'])
+@flask_jwt_extended.jwt_required
+def register_sample(dataset_name, name):
+    # 1. Validate the payload
+    payload = flask.request.get_json()
+
+    if payload is None:
+        return flask.jsonify({
+            'message': 'No JSON payload found. Cannot register the sample'
+        }), 400
+
+    info = payload.get('info', None)
+    message = _prepare_info(dataset_name, name, info,
+                            payload.get('validate', True))
+    if message is not None:
+        return flask.jsonify({
+            'message': message,
+        }), 400
+
+    # 2. Register the sample in the database
     conn = db.get_conn()
     created_at = datetime.datetime.now(datetime.timezone.utc)
     info_json = json.dumps(info)
 
     with conn.cursor() as cur:
-        cur.execute(
-            """
-            SELECT id
-            FROM datasets
-            WHERE name = %s;
-            """,
-            (dataset_name,)
-        )
-        result = cur.fetchone()
-        if result is None:
-            raise db.NotFoundException(f"Dataset '{dataset_name}' not found")
-        dataset_id = result[0]
+        dataset_id = db.dataset_id(cur, dataset_name)
 
         try:
             cur.execute(
@@ -210,17 +278,125 @@ def register_sample(dataset_name, name):
             conn.commit()
             sample_id = cur.fetchone()[0]
 
-    # 5. Create the image now or queue a job to create the image
-    if ('image' in info
-            and info['image']['status'] == 'CREATING'
-            and data_url.startswith(storage.clients.FILESYSTEM_PREFIX)):
-        if info['image']['type'] == '2D':
-            image.create_images(sample_id)
+    # 3. Queue a job to create the images. The images are only created
+    # during the request if the client asks to wait for them.
+    response = {
+        'id': sample_id,
+    }
+    if _needs_images(info):
+        if payload.get('wait_for_images', False):
+            response['image_status'] = image.create_images(sample_id, conn)
+        else:
+            image.enqueue_create_images(sample_id, info['image']['type'])
+            response['image_status'] = info['image']['status']
+    elif 'image' in info:
+        response['image_status'] = info['image']['status']
+
+    return flask.jsonify(response)
+
+
+@samples_bp.route('/datasets/<dataset_name>/samples/', methods=['POST'])
+@flask_jwt_extended.jwt_required
+def register_samples(dataset_name):
+    """
+    Registers a batch of samples in a single transaction.
+
+    The payload should look like
+    {'samples': [{'name': ..., 'info': ...}, ...], 'validate': bool}.
+    Each sample is reported back with a status of 'created',
+    'conflict' or 'invalid', in the same order as the payload.
+    """
+    # 1. Validate the payload
+    payload = flask.request.get_json()
+
+    if payload is None or not isinstance(payload.get('samples'), list):
+        return flask.jsonify({
+            'message': 'No samples list found. Cannot register the samples'
+        }), 400
+
+    samples = payload['samples']
+    if len(samples) > MAX_BATCH_SIZE:
+        return flask.jsonify({
+            'message': f'At most {MAX_BATCH_SIZE} samples can be'
+                       f' registered per request, found {len(samples)}'
+        }), 400
+
+    conn = db.get_conn()
+    with conn.cursor() as cur:
+        dataset_id = db.dataset_id(cur, dataset_name)
+
+    validate = payload.get('validate', True)
+    statuses = []
+    pending = []  # (status, info) of the samples to insert
+    rows = []
+    created_at = datetime.datetime.now(datetime.timezone.utc)
+    for sample in samples:
+        if not isinstance(sample, dict):
+            sample = {}
+        name = sample.get('name', None)
+        info = sample.get('info', None)
+        if not name:
+            message = 'No name found. Cannot register the sample'
+        else:
+            message = _prepare_info(dataset_name, name, info, validate)
+        if message is None:
+            status = {'name': name}
+            statuses.append(status)
+            pending.append((status, info))
+            rows.append((name,
+                         json.dumps(info),
+                         dataset_id,
+                         created_at,
+                         created_at))
+        else:
+            statuses.append({
+                'name': name,
+                'status': 'invalid',
+                'message': message,
+            })
+
+    # 2. Register the valid samples with one multi-row insert. Conflicting
+    # names are skipped instead of aborting the whole transaction.
+    created_ids = {}
+    if rows:
+        with conn.cursor() as cur:
+            psycopg2.extras.execute_values(
+                cur,
+                """
+                INSERT INTO samples (
+                    name,
+                    info,
+                    dataset_id,
+                    created_at,
+                    last_updated)
+                VALUES %s
+                ON CONFLICT (dataset_id, name) DO NOTHING
+                RETURNING id, name;
+                """,
+                rows,
+                # A single page so that RETURNING covers every row
+                page_size=len(rows),
+            )
+            created_ids = {name: sample_id
+                           for sample_id, name in cur.fetchall()}
+            conn.commit()
+
+    # 3. Report per-sample statuses and queue the image jobs. The samples
+    # are batched so that each job creates the images of many samples.
+    image_samples = []
+    for status, info in pending:
+        sample_id = created_ids.pop(status['name'], None)
+        if sample_id is None:
+            status['status'] = 'conflict'
         else:
-            image.enqueue_create_images(sample_id)
+            status['status'] = 'created'
+            status['id'] = sample_id
+            if _needs_images(info):
+                image_samples.append((sample_id, info['image']['type']))
+    image.enqueue_create_images_batches(image_samples)
 
     return flask.jsonify({
-        'id': sample_id,
+        'samples': statuses,
     })
 
 
@@ -1,4 +1,5 @@
 import io
+import json
 import pathlib
 
 import flask
@@ -176,12 +177,64 @@ def test_list_count_samples(test_user):
     assert res.status_code == 200
     assert res.json['count'] == 2
 
+    # Test count with filters
+    res = client.get(f'/datasets/{dataset}/samples/count',
+                     headers=headers,
+                     query_string={
+                         'label': '[1, 0, 0]',
+                     })
+    assert res.status_code == 200
+    assert res.json['count'] == 1
+    res = client.get(f'/datasets/{dataset}/samples/count',
+                     headers=headers,
+                     query_string={
+                         'split': 'training',
+                         'label': '[1, 0, 0]',
+                     })
+    assert res.status_code == 200
+    assert res.json['count'] == 0
+
     # Test no options
     res = client.get(f'/datasets/{dataset}/samples/',
                      headers=headers)
     assert res.status_code == 200
     assert len(res.json['samples']) == 2
 
+    # Test fields
+    res = client.get(f'/datasets/{dataset}/samples/',
+                     headers=headers,
+                     query_string={
+                         'fields': 'name,info.split,info.data.url',
+                     })
+    assert res.status_code == 200
+    assert res.json['samples'][0] == {
+        'name': sample1,
+        'info': {
+            'split': 'training',
+            'data': {
+                'url': 'gs://abcdefg/hijklmnop',
+            },
+        },
+    }
+    for bad_fields in ('password', 'name.first', 'info.'):
+        res = client.get(f'/datasets/{dataset}/samples/',
+                         headers=headers,
+                         query_string={
+                             'fields': bad_fields,
+                         })
+        assert res.status_code == 400
+
+    # Test streaming
+    res = client.get(f'/datasets/{dataset}/samples/',
+                     headers={
+                         'Accept': 'application/x-ndjson',
+                         **headers,
+                     })
+    assert res.status_code == 200
+    assert res.mimetype == 'application/x-ndjson'
+    lines = res.data.decode().splitlines()
+    assert [json.loads(line)['name'] for line in lines] == [sample1, sample2]
+
     # Test limit
     res = client.get(f'/datasets/{dataset}/samples/',
                      headers=headers,
@@ -231,6 +284,151 @@ def test_list_count_samples(test_user):
     assert len(res.json['samples']) == 1
     assert res.json['samples'][0]['name'] == sample1
 
+    # Test cursor
+    res = client.get(f'/datasets/{dataset}/samples/',
+                     headers=headers,
+                     query_string={
+                         'limit': 1,
+                     })
+    assert res.status_code == 200
+    assert res.json['samples'][0]['name'] == sample1
+    res = client.get(f'/datasets/{dataset}/samples/',
+                     headers=headers,
+                     query_string={
+                         'limit': 1,
+                         'cursor': res.json['next_cursor'],
+                     })
+    assert res.status_code == 200
+    assert len(res.json['samples']) == 1
+    assert res.json['samples'][0]['name'] == sample2
+    res = client.get(f'/datasets/{dataset}/samples/',
+                     headers=headers,
+                     query_string={
+                         'limit': 1,
+                         'cursor': res.json['next_cursor'],
+                     })
+    assert res.status_code == 200
+    assert res.json['samples'] == []
+    assert res.json['next_cursor'] is None
+
+    res = client.get(f'/datasets/{dataset}/samples/',
+                     headers=headers,
+                     query_string={
+                         'cursor': 'not a cursor',
+                     })
+    assert res.status_code == 400
+
+    # Cleanup all resources
+    res = client.delete(f'/datasets/{dataset}/samples/{sample1}',
+                        headers=headers)
+    assert res.status_code == 200
+    res = client.get(f'/datasets/{dataset}/samples/count',
+                     headers=headers)
+    assert res.json['count'] == 1
+    res = client.delete(f'/datasets/{dataset}/samples/{sample2}',
+                        headers=headers)
+    assert res.status_code == 200
+    res = client.delete(f'/datasets/{dataset}',
+                        headers=headers)
+    assert res.status_code == 200
+
+
+def test_register_samples(test_user):
+    dataset = 'samples_test::test_register_samples-dataset'
+    sample1 = 'samples_test::test_register_samples-sample1'
+    sample2 = 'samples_test::test_register_samples-sample2'
+
+    client = app.test_client()
+
+    res: flask.Response
+    # Log in and get a token
+    res = client.post('/login', json={
+        'email': test_user[0],
+        'password': test_user[1],
+    })
+    assert res.status_code == 200
+    access_token = res.json['access_token']
+    headers = {
+        'Authorization': 'Bearer {}'.format(access_token)
+    }
+
+    # Create a dataset
+    res = client.put(f'/datasets/{dataset}',
+                     headers=headers)
+    assert res.status_code == 200
+
+    # A batch with a duplicate and an invalid sample
+    res = client.post(f'/datasets/{dataset}/samples/',
+                      headers=headers,
+                      json={
+                          'samples': [
+                              {
+                                  'name': sample1,
+                                  'info': {
+                                      'data': {'url': 'gs://abcdefg/1'},
+                                      'split': 'training',
+                                  },
+                              },
+                              {
+                                  'name': sample2,
+                                  'info': {},
+                              },
+                              {
+                                  'name': sample1,
+                                  'info': {
+                                      'data': {'url': 'gs://abcdefg/1'},
+                                  },
+                              },
+                          ],
+                          'validate': False,
+                      })
+    assert res.status_code == 200
+    statuses = [s['status'] for s in res.json['samples']]
+    assert statuses == ['created', 'invalid', 'conflict']
+    assert 'id' in res.json['samples'][0]
+
+    # Samples that already exist should conflict
+    res = client.post(f'/datasets/{dataset}/samples/',
+                      headers=headers,
+                      json={
+                          'samples': [
+                              {
+                                  'name': sample1,
+                                  'info': {
+                                      'data': {'url': 'gs://abcdefg/1'},
+                                  },
+                              },
+                              {
+                                  'name': sample2,
+                                  'info': {
+                                      'data': {'url': 'gs://abcdefg/2'},
+                                  },
+                              },
+                          ],
+                          'validate': False,
+                      })
+    assert res.status_code == 200
+    statuses = [s['status'] for s in res.json['samples']]
+    assert statuses == ['conflict', 'created']
+
+    res = client.get(f'/datasets/{dataset}/samples/',
+                     headers=headers)
+    assert res.status_code == 200
+    assert len(res.json['samples']) == 2
+    assert res.json['samples'][0]['info']['split'] == 'training'
+
+    # Payloads without a samples list should fail
+    res = client.post(f'/datasets/{dataset}/samples/',
+                      headers=headers,
+                      json={})
+    assert res.status_code == 400
+
+    # Missing datasets should not be found
+    res = client.post('/datasets/samples_test::does-not-exist/samples/',
+                      headers=headers,
+                      json={'samples': []})
+    assert res.status_code == 404
+
     # Cleanup all resources
     res = client.delete(f'/datasets/{dataset}/samples/{sample1}',
                         headers=headers)
@@ -242,6 +440,7 @@ def test_list_count_samples(test_user):
                         headers=headers)
     assert res.status_code == 200
 
+
 @pytest.mark.skipif(env.FILESYSTEM_STORE_ROOT is None,
                     reason='Local filesystem store must be enabled')
 def test_delete_sample(test_user):
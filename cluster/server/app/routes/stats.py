@@ -0,0 +1,22 @@
+"""
+Routes for monitoring the server processes.
+"""
+import os
+
+import flask
+import flask_jwt_extended
+
+from app import db, storage
+
+stats_bp = flask.Blueprint('stats', __name__)
+
+
+@stats_bp.route('/stats', methods=['GET'])
+@flask_jwt_extended.jwt_required
+def get_stats():
+    # Each gunicorn worker has its own counters
+    return flask.jsonify({
+        'pid': os.getpid(),
+        'db': db.get_pool().stats(),
+        'storage': storage.get_registry().stats(),
+    })
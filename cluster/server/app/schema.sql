@@ -32,4 +32,13 @@ CREATE TABLE IF NOT EXISTS samples
     last_updated timestamptz                  NOT NULL,
 
     UNIQUE (dataset_id, name)
-);
\ No newline at end of file
+);
+
+/* Versions of the files in migrations/ that have been applied by cli.py migrate */
+CREATE TABLE IF NOT EXISTS schema_migrations
+(
+    version    INT PRIMARY KEY,
+    name       text        NOT NULL,
+
+    applied_at timestamptz NOT NULL
+);
@@ -6,8 +6,20 @@ To use this module. You should use get_storage_client() to get the correct
 storage client. Then call on relevant methods defined in DataStoreInterface
 to access the data.
 """
+import os
+import threading
+from typing import Dict
+
 from . import clients
 
+_STORE_CLASSES = {
+    clients.GCS_PREFIX: clients.GCSStore,
+    clients.AZURE_PREFIX: clients.AzureStore,
+    clients.TEMP_PREFIX: clients.TempStore,
+    clients.FILESYSTEM_PREFIX: clients.FilesystemStore,
+    clients.PACK_PREFIX: clients.PackStore,
+}
+
 
 def _parse_prefix(url):
     low_idx = url.find('://')
@@ -16,9 +28,77 @@ def _parse_prefix(url):
     return url[0:url.find('://') + len('://')]
 
 
+class StoreRegistry(object):
+    """
+    A thread-safe registry of storage clients, one per URL prefix.
+
+    The clients keep their credentials and HTTP connections for as long
+    as the registry lives, so they must not be shared with forked
+    processes. Use get_registry() instead of creating registries.
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._stores: Dict[str, clients.DataStoreInterface] = {}
+        self._stats = {prefix: {'constructed': 0, 'reused': 0}
+                       for prefix in _STORE_CLASSES}
+
+    def get(self, prefix: str) -> clients.DataStoreInterface:
+        """
+        Returns the storage client for the prefix, constructing it on
+        first use.
+
+        :raise ValueError: if the client type does not exist
+        """
+        if prefix not in _STORE_CLASSES:
+            raise ValueError(f"Store for prefix '{prefix}' not supported")
+        with self._lock:
+            store = self._stores.get(prefix)
+            if store is None:
+                # Constructing under the lock makes sure credentials are
+                # only loaded once even if many threads ask at once
+                store = _STORE_CLASSES[prefix]()
+                self._stores[prefix] = store
+                self._stats[prefix]['constructed'] += 1
+            else:
+                self._stats[prefix]['reused'] += 1
+        return store
+
+    def stats(self) -> Dict:
+        """
+        Returns how often each type of client was constructed and reused.
+        """
+        with self._lock:
+            return {prefix: counts.copy()
+                    for prefix, counts in self._stats.items()}
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> StoreRegistry:
+    """
+    Returns the storage client registry of this process, creating it on
+    first use.
+
+    Forked processes (gunicorn workers, rq work-horses) get a new
+    registry instead of sharing the connections of their parent.
+    """
+    global _registry
+    if _registry is None or _registry.pid != os.getpid():
+        with _registry_lock:
+            if _registry is None or _registry.pid != os.getpid():
+                _registry = StoreRegistry()
+    return _registry
+
+
 def get_storage_client(url) -> clients.DataStoreInterface:
     """
-    Returns a new storage client for the given URL.
+    Returns the storage client for the given URL.
+
+    The client is shared by every thread of the process.
 
     :param url: a URL starting with gs:// or another registered scheme
     :return: a storage client
@@ -26,13 +106,4 @@ def get_storage_client(url) -> clients.DataStoreInterface:
         type does not exist
     """
     prefix = _parse_prefix(url)
-    if prefix == clients.GCS_PREFIX:
-        return clients.GCSStore()
-    elif prefix == clients.AZURE_PREFIX:
-        return clients.AzureStore()
-    elif prefix == clients.TEMP_PREFIX:
-        return clients.TempStore()
-    elif prefix == clients.FILESYSTEM_PREFIX:
-        return clients.FilesystemStore()
-    else:
-        raise ValueError(f"Store for prefix '{prefix}' not supported")
+    return get_registry().get(prefix)
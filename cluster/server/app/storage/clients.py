@@ -5,16 +5,24 @@ To use these, you should set the corresponding environment variables,
 call get_storage_client() to get the correct storage client,
 and then use the desired DataStoreInterface method.
 """
+import collections
 import datetime
+import fcntl
+import hashlib
 import io
+import os
 import pathlib
+import shutil
+import threading
 import time
 import urllib.parse
+import uuid
 from abc import ABCMeta, abstractmethod
-from typing import Optional, Tuple, BinaryIO
+from typing import Callable, Dict, Optional, Tuple, BinaryIO, Iterator
 
 import flask
-from azure.storage.blob import BlockBlobService, BlobPermissions
+from azure.storage.blob import (BlockBlobService, BlobPermissions,
+                                ContainerPermissions)
 from google.cloud.storage import Client as GCSClient
 
 from app import env
@@ -23,6 +31,22 @@ GCS_PREFIX = 'gs://'
 AZURE_PREFIX = 'az://'
 TEMP_PREFIX = 'temp://'
 FILESYSTEM_PREFIX = 'file://'
+PACK_PREFIX = 'pack://'
+
+# The suffixes of the files of each pack of PackStore, which relayout()
+# of FilesystemStore leaves in place
+PACK_SUFFIX = '.pack'
+INDEX_SUFFIX = '.idx'
+
+# The default size of the chunks yielded by DataStoreInterface.iter_chunks()
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# How long the URLs returned by get_signed_url() are valid for
+SIGNED_URL_EXPIRATION = datetime.timedelta(minutes=15)
+# The maximum number of signed URLs cached by each client
+SIGNED_URL_CACHE_SIZE = 100000
+# The largest blob a single Azure Put Blob request can upload
+AZURE_MAX_PUT_BLOB_SIZE = 256 * 1024 * 1024
 
 
 class DataStoreInterface(object):
@@ -43,6 +67,43 @@ class DataStoreInterface(object):
         """
         raise NotImplementedError()
 
+    @abstractmethod
+    def size(self, sample_url: str) -> int:
+        """
+        Returns the size in bytes of the object at the given URL.
+
+        The behavior for when the object does not exist is undefined.
+        """
+        raise NotImplementedError()
+
+    def get_range(self, sample_url: str, start: int, end: int) -> bytes:
+        """
+        Retrieves bytes [start, end) of the contents at the given URL.
+
+        The behavior for when the object does not exist is undefined.
+        """
+        with self.get(sample_url) as stream:
+            stream.seek(start)
+            return stream.read(end - start)
+
+    def iter_chunks(self,
+                    sample_url: str,
+                    chunk_size: int = CHUNK_SIZE,
+                    start: int = 0,
+                    end: Optional[int] = None) -> Iterator[bytes]:
+        """
+        Yields bytes [start, end) of the contents at the given URL in
+        chunks of at most chunk_size bytes, so that at most one chunk is
+        held in memory. By default, all of the contents are yielded.
+
+        The behavior for when the object does not exist is undefined.
+        """
+        if end is None:
+            end = self.size(sample_url)
+        for chunk_start in range(start, end, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, end)
+            yield self.get_range(sample_url, chunk_start, chunk_end)
+
     @abstractmethod
     def put(self, sample_url: str, stream: BinaryIO):
         """
@@ -70,47 +131,73 @@ class DataStoreInterface(object):
     def get_signed_url(self, sample_url) -> str:
         """
         Returns a public signed HTTPS URL for the given object that
-        lasts for 15 minutes.
+        lasts for 15 minutes. Cloud stores reuse signed URLs for
+        env.SIGNED_URL_CACHE_TTL seconds, so a URL may be returned with
+        less time left.
 
         The behavior for when the object does not exist is undefined.
         """
         raise NotImplementedError()
 
+    def get_signed_upload_url(self, sample_url) -> Optional[Dict]:
+        """
+        Returns a request which uploads the contents of the given URL
+        directly to the store, without going through the server. The
+        request lasts for 15 minutes.
+
+        The request is a dictionary of the 'method', 'url' and 'headers'
+        to send the contents with, and the 'max_size' in bytes the request
+        can upload or None if there is no practical limit. Larger contents
+        should be uploaded through the server. Stores which cannot be
+        reached by clients return None.
+        """
+        return None
 
-class _ClientCache(object):
-    # Not thread-safe but it seems to work.
 
-    def __init__(self):
-        self._data = {}
+class _SignedURLCache(object):
+    """
+    A thread-safe LRU cache of signed URLs which expire after ttl seconds.
 
-    def get(self, username) -> Optional:
-        value = self._data.get(username, None)
-        if value is None:
-            return None
-        client, last_used = value
-        if time.time() - last_used > 60:
-            del self._data[username]
-            return None
+    The ttl should be shorter than SIGNED_URL_EXPIRATION so that cached
+    URLs are still valid for some time after they are handed out.
+    """
 
-        return client
+    def __init__(self, ttl: float, maxsize: int = SIGNED_URL_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._data = collections.OrderedDict()
 
-    def put(self, username: str, client):
-        self._data[username] = client, time.time()
+    def get(self, key: str, sign: Callable[[], str]) -> str:
+        """
+        Returns the cached URL for the key, calling sign() to create
+        it if it is missing or expired.
+        """
+        if self.ttl <= 0:
+            return sign()
+        now = time.time()
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None and now - value[1] < self.ttl:
+                self._data.move_to_end(key)
+                return value[0]
+        # Signing is done outside of the lock, at worst a URL is signed
+        # more than once
+        url = sign()
+        with self._lock:
+            self._data[key] = url, now
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return url
 
 
 class GCSStore(DataStoreInterface):
-    client_cache = _ClientCache()
-
     def __init__(self):
-        client = self.client_cache.get('gcs')
-        if client is None:
-            self.client = GCSClient.from_service_account_json(
-                env.GOOGLE_APPLICATION_CREDENTIALS
-            )
-        else:
-            self.client: GCSClient = client
-            self.client_cache.get('gcs')
-        self.client_cache.put('gcs', self.client)
+        self.client = GCSClient.from_service_account_json(
+            env.GOOGLE_APPLICATION_CREDENTIALS
+        )
+        self.url_cache = _SignedURLCache(env.SIGNED_URL_CACHE_TTL)
 
     def get(self, sample_url: str) -> BinaryIO:
         bucket_name, blob_name = self._parse_url(sample_url)
@@ -121,6 +208,20 @@ class GCSStore(DataStoreInterface):
         stream.seek(0)
         return stream
 
+    def size(self, sample_url: str) -> int:
+        bucket_name, blob_name = self._parse_url(sample_url)
+        bucket = self.client.bucket(bucket_name)
+        return bucket.get_blob(blob_name).size
+
+    def get_range(self, sample_url: str, start: int, end: int) -> bytes:
+        bucket_name, blob_name = self._parse_url(sample_url)
+        bucket = self.client.bucket(bucket_name)
+        blob = bucket.blob(blob_name)
+        stream = io.BytesIO()
+        # The end of ranged downloads is inclusive
+        blob.download_to_file(stream, start=start, end=end - 1)
+        return stream.getvalue()
+
     def put(self, sample_url: str, stream: BinaryIO):
         bucket_name, blob_name = self._parse_url(sample_url)
         bucket = self.client.bucket(bucket_name)
@@ -140,12 +241,31 @@ class GCSStore(DataStoreInterface):
         blob.delete()
 
     def get_signed_url(self, sample_url) -> str:
+        def sign() -> str:
+            bucket_name, blob_name = self._parse_url(sample_url)
+            bucket = self.client.bucket(bucket_name)
+            blob = bucket.blob(blob_name)
+            return blob.generate_signed_url(expiration=SIGNED_URL_EXPIRATION)
+
+        return self.url_cache.get(sample_url, sign)
+
+    def get_signed_upload_url(self, sample_url) -> Optional[Dict]:
         bucket_name, blob_name = self._parse_url(sample_url)
         bucket = self.client.bucket(bucket_name)
         blob = bucket.blob(blob_name)
-        return blob.generate_signed_url(
-            expiration=datetime.timedelta(minutes=15)
-        )
+        # The content type is part of the signature
+        content_type = 'application/octet-stream'
+        url = blob.generate_signed_url(expiration=SIGNED_URL_EXPIRATION,
+                                       method='PUT',
+                                       content_type=content_type)
+        return {
+            'method': 'PUT',
+            'url': url,
+            'headers': {
+                'Content-Type': content_type,
+            },
+            'max_size': None,
+        }
 
     @staticmethod
     def _parse_url(url: str):
@@ -156,16 +276,13 @@ class GCSStore(DataStoreInterface):
 
 
 class AzureStore(DataStoreInterface):
-    service_cache = _ClientCache()
-
     def __init__(self):
-        service = self.service_cache.get('azure')
-        if service is None:
-            self.service = BlockBlobService(**env.AZURE_STORAGE_CREDENTIALS)
-        else:
-            self.service: BlockBlobService = service
-            self.service_cache.get('azure')
-        self.service_cache.put('azure', self.service)
+        self.service = BlockBlobService(**env.AZURE_STORAGE_CREDENTIALS)
+        self.url_cache = _SignedURLCache(env.SIGNED_URL_CACHE_TTL)
+        self.container_sas = env.AZURE_CONTAINER_SAS
+        # Containers known to exist, so that direct uploads do not need
+        # to create them every time
+        self._containers = set()
 
     def get(self, sample_url: str) -> BinaryIO:
         container_name, blob_name = self._parser_url(sample_url)
@@ -174,6 +291,20 @@ class AzureStore(DataStoreInterface):
         stream.seek(0)
         return stream
 
+    def size(self, sample_url: str) -> int:
+        container_name, blob_name = self._parser_url(sample_url)
+        blob = self.service.get_blob_properties(container_name, blob_name)
+        return blob.properties.content_length
+
+    def get_range(self, sample_url: str, start: int, end: int) -> bytes:
+        container_name, blob_name = self._parser_url(sample_url)
+        # end_range is inclusive
+        blob = self.service.get_blob_to_bytes(container_name,
+                                              blob_name,
+                                              start_range=start,
+                                              end_range=end - 1)
+        return blob.content
+
     def put(self, sample_url: str, stream: BinaryIO):
         container_name, blob_name = self._parser_url(sample_url)
         self.service.create_container(container_name)
@@ -189,17 +320,62 @@ class AzureStore(DataStoreInterface):
 
     def get_signed_url(self, sample_url) -> str:
         container_name, blob_name = self._parser_url(sample_url)
+        if self.container_sas:
+            # One signature is shared by every blob in the container
+            signature = self.url_cache.get(
+                f'{AZURE_PREFIX}{container_name}/',
+                lambda: self._sign_container(container_name))
+            return self.service.make_blob_url(container_name,
+                                              blob_name,
+                                              protocol='https',
+                                              sas_token=signature)
+
+        def sign() -> str:
+            signature = self.service.generate_blob_shared_access_signature(
+                container_name,
+                blob_name,
+                permission=BlobPermissions(read=True),
+                expiry=datetime.datetime.utcnow() + SIGNED_URL_EXPIRATION,
+            )
+            return self.service.make_blob_url(container_name,
+                                              blob_name,
+                                              protocol='https',
+                                              sas_token=signature)
+
+        return self.url_cache.get(sample_url, sign)
+
+    def get_signed_upload_url(self, sample_url) -> Optional[Dict]:
+        container_name, blob_name = self._parser_url(sample_url)
+        if container_name not in self._containers:
+            # Unlike put(), the client cannot create the container itself
+            self.service.create_container(container_name)
+            self._containers.add(container_name)
         signature = self.service.generate_blob_shared_access_signature(
             container_name,
             blob_name,
-            permission=BlobPermissions(read=True),
-            expiry=datetime.datetime.utcnow() + datetime.timedelta(minutes=15),
+            permission=BlobPermissions(create=True, write=True),
+            expiry=datetime.datetime.utcnow() + SIGNED_URL_EXPIRATION,
         )
         url = self.service.make_blob_url(container_name,
                                          blob_name,
                                          protocol='https',
                                          sas_token=signature)
-        return url
+        # A single Put Blob request. put() splits larger blobs into blocks.
+        return {
+            'method': 'PUT',
+            'url': url,
+            'headers': {
+                'x-ms-blob-type': 'BlockBlob',
+            },
+            'max_size': AZURE_MAX_PUT_BLOB_SIZE,
+        }
+
+    def _sign_container(self, container_name: str) -> str:
+        return self.service.generate_container_shared_access_signature(
+            container_name,
+            permission=ContainerPermissions(read=True),
+            expiry=datetime.datetime.utcnow() + SIGNED_URL_EXPIRATION,
+        )
 
     @staticmethod
     def _parser_url(url) -> Tuple[str, str]:
@@ -220,8 +396,27 @@ class TempStore(DataStoreInterface):
     def get(self, sample_url: str) -> BinaryIO:
         return self.data[sample_url]
 
+    def size(self, sample_url: str) -> int:
+        stream = self.data[sample_url]
+        position = stream.tell()
+        size = stream.seek(0, io.SEEK_END)
+        stream.seek(position)
+        return size
+
+    def get_range(self, sample_url: str, start: int, end: int) -> bytes:
+        # The stored stream is also returned by get() so it must stay open
+        # and at the same position
+        stream = self.data[sample_url]
+        position = stream.tell()
+        stream.seek(start)
+        content = stream.read(end - start)
+        stream.seek(position)
+        return content
+
     def put(self, sample_url: str, stream: BinaryIO):
-        self.data[sample_url] = stream
+        # Copied since streams such as request bodies are closed after
+        # the request
+        self.data[sample_url] = io.BytesIO(stream.read())
 
     def exists(self, sample_url) -> bool:
         return sample_url in self.data
@@ -236,39 +431,370 @@ class TempStore(DataStoreInterface):
 
 
 class FilesystemStore(DataStoreInterface):
-    def __init__(self):
+    def __init__(self,
+                 buffer_size: int = None,
+                 fsync: bool = None,
+                 fanout: int = None):
+        """
+        :param buffer_size: the number of bytes copied per write,
+            env.FILESYSTEM_STORE_BUFFER_SIZE by default
+        :param fsync: whether to flush files to disk before renaming them
+            into place, env.FILESYSTEM_STORE_FSYNC by default
+        :param fanout: the number of hashed directory levels files are
+            spread over, env.FILESYSTEM_STORE_FANOUT by default
+        """
         self.root_path = pathlib.Path(env.FILESYSTEM_STORE_ROOT).resolve()
+        if buffer_size is None:
+            buffer_size = env.FILESYSTEM_STORE_BUFFER_SIZE
+        if fsync is None:
+            fsync = env.FILESYSTEM_STORE_FSYNC
+        if fanout is None:
+            fanout = env.FILESYSTEM_STORE_FANOUT
+        self.buffer_size = buffer_size
+        self.fsync = fsync
+        self.fanout = fanout
 
     # TODO: Make the blueno-server pod restart itself if it fails to
     #  a stale file handle error
     def get(self, sample_url: str) -> BinaryIO:
-        path = self._parse_url(sample_url)
+        path = self._find_path(sample_url)
         return path.open('rb')
 
+    def size(self, sample_url: str) -> int:
+        path = self._find_path(sample_url)
+        return path.stat().st_size
+
+    def iter_chunks(self,
+                    sample_url: str,
+                    chunk_size: int = CHUNK_SIZE,
+                    start: int = 0,
+                    end: Optional[int] = None) -> Iterator[bytes]:
+        if end is None:
+            end = self.size(sample_url)
+        # Seek once instead of opening the file per chunk
+        with self.get(sample_url) as f:
+            f.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
     def put(self, sample_url: str, stream: BinaryIO):
         path = self._parse_url(sample_url)
         parent: pathlib.Path = path.parent
         parent.mkdir(parents=True, exist_ok=True)
-        with path.open('wb') as f:
-            f.write(stream.read())
+        # The data is written to a hidden sibling which is then renamed
+        # into place, so readers never see a partially written file
+        temp_path = parent / f'.{path.name}.{uuid.uuid4().hex}.tmp'
+        try:
+            with temp_path.open('xb') as f:
+                # Copy in chunks so that large uploads are not held in
+                # memory
+                shutil.copyfileobj(stream, f, self.buffer_size)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(str(temp_path), str(path))
+        except BaseException:
+            if temp_path.exists():
+                temp_path.unlink()
+            raise
+        if self.fsync:
+            # Persist the rename as well
+            dir_fd = os.open(str(parent), os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
 
     def exists(self, sample_url) -> bool:
-        path = self._parse_url(sample_url)
+        path = self._find_path(sample_url)
         return path.exists()
 
     def delete(self, sample_url):
-        path = self._parse_url(sample_url)
+        path = self._find_path(sample_url)
         path.unlink()  # Note that this doesn't delete empty parent directories
 
     def get_signed_url(self, sample_url) -> str:
         return urllib.parse.urljoin(flask.request.host_url,
                                     f'/data/download?url={sample_url}')
 
+    def get_path(self, sample_url: str) -> pathlib.Path:
+        """
+        Returns the path of the file of the object at the given URL.
+        """
+        return self._find_path(sample_url)
+
+    def relayout(self, relative_dir: str = '') -> int:
+        """
+        Moves the files in the relative directory of the store into the
+        current layout, so that files written before the fan-out layout
+        was enabled no longer need a second lookup.
+
+        :return: the number of files moved
+        """
+        moved = 0
+        for dirpath, _, filenames in os.walk(str(self.root_path /
+                                                 relative_dir)):
+            for filename in filenames:
+                if filename.startswith('.') and filename.endswith('.tmp'):
+                    continue  # Written by an unfinished put()
+                path = pathlib.Path(dirpath) / filename
+                if self._is_pack_file(path):
+                    continue  # PackStore looks these up at fixed paths
+                relative_path = self._logical_path(path)
+                new_path = self._layout_path(relative_path)
+                if new_path != path:
+                    new_path.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(str(path), str(new_path))
+                    moved += 1
+        return moved
+
+    @staticmethod
+    def _is_pack_file(path: pathlib.Path) -> bool:
+        """
+        Returns whether the file is the pack or index file of a PackStore
+        pack, which always come in pairs.
+        """
+        if path.suffix not in (PACK_SUFFIX, INDEX_SUFFIX):
+            return False
+        return (path.with_suffix(PACK_SUFFIX).exists()
+                and path.with_suffix(INDEX_SUFFIX).exists())
+
     def _parse_url(self, url) -> pathlib.Path:
+        """
+        Returns the path which the object at the URL is written to.
+        """
+        return self._layout_path(self._relative_path(url))
+
+    def _find_path(self, url) -> pathlib.Path:
+        """
+        Returns the path of the existing object at the URL.
+        """
+        path = self._parse_url(url)
+        if self.fanout and not path.exists():
+            # Files written before the fan-out layout was enabled are
+            # found at their flat paths until relayout() moves them
+            flat_path = self.root_path / self._relative_path(url)
+            if flat_path.exists():
+                return flat_path
+        return path
+
+    def _layout_path(self, relative_path: pathlib.PurePath) -> pathlib.Path:
+        if not self.fanout:
+            return self.root_path / relative_path
+        # Hashing spreads the files of a directory over 256 ** fanout
+        # subdirectories, so that no directory gets too large
+        digest = hashlib.md5(relative_path.as_posix().encode()).hexdigest()
+        levels = [digest[2 * i:2 * i + 2] for i in range(self.fanout)]
+        return self.root_path.joinpath(relative_path.parent,
+                                       *levels,
+                                       relative_path.name)
+
+    def _logical_path(self, path: pathlib.Path) -> pathlib.PurePath:
+        """
+        Returns the relative path of the URL of the file at the path,
+        which is either in the current layout or flat.
+        """
+        relative_path = path.relative_to(self.root_path)
+        parts = relative_path.parts
+        if self.fanout and len(parts) > self.fanout:
+            unhashed_path = pathlib.PurePath(*parts[:-self.fanout - 1],
+                                             parts[-1])
+            if self._layout_path(unhashed_path) == path:
+                return unhashed_path
+        return relative_path
+
+    @staticmethod
+    def _relative_path(url) -> pathlib.PurePath:
         if not url.startswith(FILESYSTEM_PREFIX):
             raise ValueError(f"URL should start with {FILESYSTEM_PREFIX}")
         relative_path = url[len(FILESYSTEM_PREFIX):]
         if relative_path.startswith('/'):
             raise ValueError(
                 f"Expected relative path, got absolute path {relative_path}")
-        return self.root_path / relative_path
+        return pathlib.PurePath(relative_path)
+
+
+class _PackIndex(object):
+    """
+    The offsets and lengths of the objects in a pack, read from its
+    append-only index file.
+
+    Lookups stat the index file and only read the entries appended since
+    the last read, so objects written by other processes are found
+    without reading the whole index again.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[int, int]] = {}
+        self._position = 0
+
+    def lookup(self, name: str) -> Optional[Tuple[int, int]]:
+        """
+        Returns the offset and length of the object, or None if it does
+        not exist.
+        """
+        with self._lock:
+            self._refresh()
+            entry = self._entries.get(name)
+        if entry is None or entry[0] < 0:
+            return None  # Missing or deleted
+        return entry
+
+    def _refresh(self):
+        try:
+            if self.path.stat().st_size == self._position:
+                return
+            with self.path.open('rb') as f:
+                f.seek(self._position)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # A line may be partially written by another process, so only
+        # complete lines are read
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            name, offset, length = line.decode().split('\t')
+            self._entries[name] = int(offset), int(length)
+        self._position += end
+
+
+class PackStore(DataStoreInterface):
+    """
+    Stores many small objects in append-only pack files on the filesystem
+    instead of one file per object.
+
+    pack://dir/name is stored in the pack FILESYSTEM_STORE_ROOT/dir.pack.
+    Its offset and length are appended to the index file dir.idx, so an
+    object is read with a single seek. Overwritten and deleted objects
+    are not removed from the pack.
+    """
+
+    def __init__(self):
+        self.root_path = pathlib.Path(env.FILESYSTEM_STORE_ROOT).resolve()
+        self.fsync = env.FILESYSTEM_STORE_FSYNC
+        # lockf() locks belong to the process, so they do not stop the
+        # threads of this process, like those uploading 3D slices, from
+        # appending at the same time
+        self._append_lock = threading.Lock()
+        self._indexes_lock = threading.Lock()
+        self._indexes: Dict[pathlib.Path, _PackIndex] = {}
+
+    def get(self, sample_url: str) -> BinaryIO:
+        return io.BytesIO(self.get_range(sample_url, 0,
+                                         self.size(sample_url)))
+
+    def size(self, sample_url: str) -> int:
+        pack_path, name = self._parse_url(sample_url)
+        return self._lookup(pack_path, name)[1]
+
+    def get_range(self, sample_url: str, start: int, end: int) -> bytes:
+        return b''.join(self.iter_chunks(sample_url, start=start, end=end))
+
+    def iter_chunks(self,
+                    sample_url: str,
+                    chunk_size: int = CHUNK_SIZE,
+                    start: int = 0,
+                    end: Optional[int] = None) -> Iterator[bytes]:
+        pack_path, name = self._parse_url(sample_url)
+        offset, length = self._lookup(pack_path, name)
+        if end is None or end > length:
+            end = length
+        with self._pack_file(pack_path).open('rb') as f:
+            f.seek(offset + start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def put(self, sample_url: str, stream: BinaryIO):
+        pack_path, name = self._parse_url(sample_url)
+        pack_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._append_lock, self._pack_file(pack_path).open('ab') as f:
+            # Appends from other processes wait for this one to finish
+            fcntl.lockf(f, fcntl.LOCK_EX)
+            try:
+                offset = f.seek(0, io.SEEK_END)
+                shutil.copyfileobj(stream, f, env.FILESYSTEM_STORE_BUFFER_SIZE)
+                length = f.tell() - offset
+                self._append_entry(f, pack_path, name, offset, length)
+            finally:
+                fcntl.lockf(f, fcntl.LOCK_UN)
+
+    def exists(self, sample_url) -> bool:
+        pack_path, name = self._parse_url(sample_url)
+        return self._index(pack_path).lookup(name) is not None
+
+    def delete(self, sample_url):
+        pack_path, name = self._parse_url(sample_url)
+        with self._append_lock, self._pack_file(pack_path).open('ab') as f:
+            fcntl.lockf(f, fcntl.LOCK_EX)
+            try:
+                self._append_entry(f, pack_path, name, -1, 0)
+            finally:
+                fcntl.lockf(f, fcntl.LOCK_UN)
+
+    def get_signed_url(self, sample_url) -> str:
+        return urllib.parse.urljoin(flask.request.host_url,
+                                    f'/data/download?url={sample_url}')
+
+    def _append_entry(self, pack_file: BinaryIO, pack_path: pathlib.Path,
+                      name: str, offset: int, length: int):
+        # Called with the lock of the pack held
+        if self.fsync:
+            pack_file.flush()
+            os.fsync(pack_file.fileno())
+        with self._index_file(pack_path).open('ab') as f:
+            f.write(f'{name}\t{offset}\t{length}\n'.encode())
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _lookup(self, pack_path: pathlib.Path, name: str) -> Tuple[int, int]:
+        entry = self._index(pack_path).lookup(name)
+        if entry is None:
+            raise FileNotFoundError(f"'{name}' not found in {pack_path}")
+        return entry
+
+    def _index(self, pack_path: pathlib.Path) -> _PackIndex:
+        with self._indexes_lock:
+            index = self._indexes.get(pack_path)
+            if index is None:
+                index = _PackIndex(self._index_file(pack_path))
+                self._indexes[pack_path] = index
+        return index
+
+    @staticmethod
+    def _pack_file(pack_path: pathlib.Path) -> pathlib.Path:
+        return pack_path.parent / f'{pack_path.name}{PACK_SUFFIX}'
+
+    @staticmethod
+    def _index_file(pack_path: pathlib.Path) -> pathlib.Path:
+        return pack_path.parent / f'{pack_path.name}{INDEX_SUFFIX}'
+
+    def _parse_url(self, url) -> Tuple[pathlib.Path, str]:
+        """
+        Returns the path of the pack without a suffix and the name of the
+        object in the pack.
+        """
+        if not url.startswith(PACK_PREFIX):
+            raise ValueError(f"URL should start with {PACK_PREFIX}")
+        relative_path = url[len(PACK_PREFIX):]
+        if relative_path.startswith('/'):
+            raise ValueError(
+                f"Expected relative path, got absolute path {relative_path}")
+        if '/' not in relative_path:
+            raise ValueError(f"Expected pack and object name in {url}")
+        pack_id, name = relative_path.rsplit('/', maxsplit=1)
+        if not name or '\t' in name or '\n' in name:
+            raise ValueError(f"Invalid object name '{name}'")
+        return self.root_path / pack_id, name
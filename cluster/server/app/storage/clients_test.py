@@ -1,6 +1,7 @@
 import io
 
 import pytest
+import requests
 
 from app import env, app
 from app.storage import clients
@@ -19,6 +20,11 @@ def test_azure_store():
 
     download_stream = client.get(url)
     assert download_stream.read() == test_bytes
+    assert b''.join(client.iter_chunks(url, chunk_size=4)) == test_bytes
+    assert client.size(url) == len(test_bytes)
+    assert client.get_range(url, 2, 7) == test_bytes[2:7]
+    assert b''.join(client.iter_chunks(url, chunk_size=4, start=2, end=7)) \
+        == test_bytes[2:7]
 
     client.delete(url)
     assert not client.exists(url)
@@ -33,6 +39,13 @@ def test_azure_get_signed_url():
     stream = io.BytesIO(b'test: test_azure_get_signed_url')
     az_client.put(url, stream)
     assert az_client.get_signed_url(url).startswith('https://')
+    assert az_client.get_signed_url(url) == az_client.get_signed_url(url)
+
+    az_client.container_sas = True
+    other_url = 'az://blueno/test/other.txt'
+    signed_url = az_client.get_signed_url(url)
+    other_signed_url = az_client.get_signed_url(other_url)
+    assert signed_url.split('?')[1] == other_signed_url.split('?')[1]
 
 
 @pytest.mark.skipif(env.GOOGLE_APPLICATION_CREDENTIALS is None,
@@ -49,11 +62,53 @@ def test_gcs_store():
 
     download_stream = client.get(url)
     assert download_stream.read() == test_bytes
+    assert b''.join(client.iter_chunks(url, chunk_size=4)) == test_bytes
+    assert client.size(url) == len(test_bytes)
+    assert client.get_range(url, 2, 7) == test_bytes[2:7]
+    assert b''.join(client.iter_chunks(url, chunk_size=4, start=2, end=7)) \
+        == test_bytes[2:7]
 
     client.delete(url)
     assert not client.exists(url)
 
 
+@pytest.mark.skipif(env.AZURE_STORAGE_CREDENTIALS is None,
+                    reason='Azure credentials needed')
+def test_azure_get_signed_upload_url():
+    az_client = clients.AzureStore()
+    url = 'az://blueno/test/test_azure_get_signed_upload_url.txt'
+
+    upload = az_client.get_signed_upload_url(url)
+    assert upload['max_size'] == clients.AZURE_MAX_PUT_BLOB_SIZE
+    res = requests.request(upload['method'],
+                           upload['url'],
+                           headers=upload['headers'],
+                           data=b'uploaded directly')
+    assert res.status_code == 201
+    assert az_client.get(url).read() == b'uploaded directly'
+    az_client.delete(url)
+
+
+@pytest.mark.skipif(env.GOOGLE_APPLICATION_CREDENTIALS is None,
+                    reason='GCP credentials needed')
+def test_gcs_get_signed_upload_url():
+    gcs_client = clients.GCSStore()
+    url = 'gs://elvo-platform/test/test_gcs_get_signed_upload_url.txt'
+
+    upload = gcs_client.get_signed_upload_url(url)
+    res = requests.request(upload['method'],
+                           upload['url'],
+                           headers=upload['headers'],
+                           data=b'uploaded directly')
+    assert res.status_code == 200
+    assert gcs_client.get(url).read() == b'uploaded directly'
+    gcs_client.delete(url)
+
+
+def test_temp_store_get_signed_upload_url():
+    assert clients.TempStore().get_signed_upload_url('temp://a.txt') is None
+
+
 # Duplicated once in image_test.py
 @pytest.mark.skipif(env.GOOGLE_APPLICATION_CREDENTIALS is None,
                     reason='GCP credentials needed')
@@ -79,9 +134,115 @@ def test_filesystem_store():
 
     download_stream = client.get(url)
     assert download_stream.read() == test_bytes
+    assert b''.join(client.iter_chunks(url, chunk_size=4)) == test_bytes
+    assert client.size(url) == len(test_bytes)
+    assert client.get_range(url, 2, 7) == test_bytes[2:7]
+    assert b''.join(client.iter_chunks(url, chunk_size=4, start=2, end=7)) \
+        == test_bytes[2:7]
+
+    client.delete(url)
+    assert not client.exists(url)
+
+
+class _FailingStream(io.BytesIO):
+    def read(self, *args):
+        chunk = super().read(*args)
+        if not chunk:
+            raise IOError('connection lost')
+        return chunk
+
+
+@pytest.mark.skipif(env.FILESYSTEM_STORE_ROOT is None,
+                    reason='Filesystem configuration needed')
+def test_filesystem_store_atomic_put():
+    client = clients.FilesystemStore(buffer_size=4, fsync=True)
+    url = 'file://test_filesystem_store_atomic_put/data.txt'
+    path = client._parse_url(url)
+
+    client.put(url, io.BytesIO(b'first version'))
+    client.put(url, io.BytesIO(b'second version'))
+    assert client.get(url).read() == b'second version'
+
+    # A failed upload leaves the previous file in place
+    with pytest.raises(IOError):
+        client.put(url, _FailingStream(b'third version'))
+    assert client.get(url).read() == b'second version'
+    assert [p.name for p in path.parent.iterdir()] == ['data.txt']
+
+    client.delete(url)
+
+
+@pytest.mark.skipif(env.FILESYSTEM_STORE_ROOT is None,
+                    reason='Filesystem configuration needed')
+def test_filesystem_store_fanout():
+    flat_client = clients.FilesystemStore(fanout=0)
+    client = clients.FilesystemStore(fanout=2)
+    old_url = 'file://test_filesystem_store_fanout/old.txt'
+    new_url = 'file://test_filesystem_store_fanout/new.txt'
+
+    flat_client.put(old_url, io.BytesIO(b'old'))
+    client.put(new_url, io.BytesIO(b'new'))
+    new_path = client._parse_url(new_url)
+    assert len(new_path.relative_to(client.root_path).parts) == 4
+
+    # Flat files are still found before they are moved
+    assert client.exists(old_url)
+    assert client.get(old_url).read() == b'old'
+
+    assert client.relayout('test_filesystem_store_fanout') == 1
+    assert client._parse_url(old_url).exists()
+    assert client.get(old_url).read() == b'old'
+    assert client.get(new_url).read() == b'new'
+    assert client.relayout('test_filesystem_store_fanout') == 0
+
+    client.delete(old_url)
+    client.delete(new_url)
+    assert not client.exists(old_url)
+
+
+@pytest.mark.skipif(env.FILESYSTEM_STORE_ROOT is None,
+                    reason='Filesystem configuration needed')
+def test_pack_store():
+    client = clients.PackStore()
+    url = 'pack://test_pack_store/b.npy'
+
+    client.put('pack://test_pack_store/a.npy', io.BytesIO(b'first'))
+    client.put(url, io.BytesIO(b'0123456789'))
+    assert client.exists(url)
+    assert client.get(url).read() == b'0123456789'
+    assert client.size(url) == 10
+    assert client.get_range(url, 2, 5) == b'234'
+    assert list(client.iter_chunks(url, chunk_size=4)) == [
+        b'0123', b'4567', b'89',
+    ]
+
+    # Other processes see objects written after their index was read
+    other_client = clients.PackStore()
+    client.put(url, io.BytesIO(b'new'))
+    assert other_client.get(url).read() == b'new'
 
     client.delete(url)
     assert not client.exists(url)
+    assert not other_client.exists(url)
+
+
+@pytest.mark.skipif(env.FILESYSTEM_STORE_ROOT is None,
+                    reason='Filesystem configuration needed')
+def test_relayout_keeps_packs():
+    pack_client = clients.PackStore()
+    url = 'pack://test_relayout_keeps_packs/packed/a.npy'
+    pack_client.put(url, io.BytesIO(b'packed'))
+
+    client = clients.FilesystemStore(fanout=2)
+    assert client.relayout('test_relayout_keeps_packs') == 0
+    assert pack_client.exists(url)
+    assert clients.PackStore().get(url).read() == b'packed'
+
+    pack_client.delete(url)
+    assert client.get('pack://test_pack_store/a.npy').read() == b'first'
+
+    with pytest.raises(ValueError):
+        client.put('pack://no-pack.npy', io.BytesIO(b''))
 
 
 @pytest.mark.skipif(env.FILESYSTEM_STORE_ROOT is None,
@@ -94,3 +255,39 @@ def test_fileystem_signed_url():
     with app.test_request_context('http://www.example.com/rest/of/the/route'):
         assert client.get_signed_url(url) == \
                f'http://www.example.com/data/download?url={url}'
+
+
+def test_temp_store_iter_chunks():
+    client = clients.TempStore()
+    url = 'temp://test_temp_store_iter_chunks.txt'
+
+    client.put(url, io.BytesIO(b'0123456789'))
+    chunks = list(client.iter_chunks(url, chunk_size=4))
+    assert chunks == [b'0123', b'4567', b'89']
+
+    chunks = list(client.iter_chunks(url, chunk_size=4, start=3, end=9))
+    assert chunks == [b'3456', b'78']
+    # Ranged reads leave the stored stream where it was
+    assert client.get(url).read() == b'0123456789'
+
+
+def test_signed_url_cache():
+    calls = []
+
+    def sign():
+        calls.append(1)
+        return f'https://example.com/signed?sig={len(calls)}'
+
+    cache = clients._SignedURLCache(ttl=60, maxsize=2)
+    assert cache.get('a', sign) == 'https://example.com/signed?sig=1'
+    assert cache.get('a', sign) == 'https://example.com/signed?sig=1'
+    assert len(calls) == 1
+
+    # The least recently used URL is evicted
+    cache.get('b', sign)
+    cache.get('c', sign)
+    assert cache.get('a', sign) == 'https://example.com/signed?sig=4'
+
+    # Expired URLs are signed again
+    cache.ttl = 0
+    assert cache.get('a', sign) == 'https://example.com/signed?sig=5'
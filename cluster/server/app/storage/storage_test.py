@@ -0,0 +1,39 @@
+import concurrent.futures
+
+import pytest
+
+from app import storage
+from app.storage import clients
+
+
+def test_get_storage_client_reuses_clients():
+    registry = storage.get_registry()
+    before = registry.stats()[clients.TEMP_PREFIX]
+
+    first = storage.get_storage_client('temp://a.txt')
+    second = storage.get_storage_client('temp://b.txt')
+    assert first is second
+    assert storage.get_registry() is registry
+
+    after = registry.stats()[clients.TEMP_PREFIX]
+    assert after['constructed'] <= 1
+    assert after['reused'] >= before['reused'] + 1
+
+
+def test_registry_is_thread_safe():
+    registry = storage.StoreRegistry()
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        stores = list(executor.map(lambda _: registry.get('temp://'),
+                                   range(100)))
+    assert all(store is stores[0] for store in stores)
+    assert registry.stats()['temp://'] == {
+        'constructed': 1,
+        'reused': 99,
+    }
+
+
+def test_get_storage_client_invalid_url():
+    with pytest.raises(ValueError):
+        storage.get_storage_client('no-prefix')
+    with pytest.raises(ValueError):
+        storage.get_storage_client('s3://bucket/key')
@@ -0,0 +1,48 @@
+"""
+Measures the throughput of writing large .npy files with FilesystemStore,
+for different buffer sizes and with and without fsync.
+
+Run it on the volume which is mounted in the server pods (ex. NFS) to
+pick FILESYSTEM_STORE_BUFFER_SIZE and FILESYSTEM_STORE_FSYNC.
+
+Usage (with FILESYSTEM_STORE_ROOT set):
+    python benchmark_filesystem.py
+"""
+import io
+import time
+
+import numpy
+
+from app.storage import clients
+
+ARRAY_SHAPE = (512, 512, 128)  # 128 MiB of float32
+NUM_WRITES = 5
+BUFFER_SIZES = [64 * 1024, 1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024]
+
+
+def _benchmark(data: bytes, buffer_size: int, fsync: bool):
+    store = clients.FilesystemStore(buffer_size=buffer_size, fsync=fsync)
+    url = 'file://benchmark_filesystem/array.npy'
+    start = time.time()
+    for _ in range(NUM_WRITES):
+        store.put(url, io.BytesIO(data))
+    end = time.time()
+    store.delete(url)
+
+    mib_per_second = NUM_WRITES * len(data) / (end - start) / 1024 ** 2
+    print(f'buffer_size={buffer_size // 1024}KiB fsync={fsync}:'
+          f' {mib_per_second:.1f} MiB/second', flush=True)
+
+
+def benchmark():
+    stream = io.BytesIO()
+    numpy.save(stream, numpy.random.rand(*ARRAY_SHAPE).astype('float32'))
+    data = stream.getvalue()
+
+    for fsync in (False, True):
+        for buffer_size in BUFFER_SIZES:
+            _benchmark(data, buffer_size, fsync)
+
+
+if __name__ == '__main__':
+    benchmark()
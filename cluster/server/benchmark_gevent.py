@@ -0,0 +1,62 @@
+"""
+Measures the throughput of concurrent queries from greenlets, with and
+without the gevent wait callback installed by the server.
+
+Each query sleeps in Postgres, similar to a slow list_samples call. With
+the callback, throughput should scale with the number of greenlets.
+Without it, the greenlets are serialized.
+
+Usage (with the POSTGRES_* environment variables set):
+    python benchmark_gevent.py
+"""
+from gevent import monkey
+
+# Patch before other imports, like gunicorn's gevent worker does
+monkey.patch_all()
+
+import time  # noqa: E402
+
+import gevent.pool  # noqa: E402
+import psycopg2  # noqa: E402
+import psycopg2.extensions  # noqa: E402
+
+from app import env, green  # noqa: E402
+
+QUERY_SECONDS = 0.05
+QUERIES_PER_GREENLET = 10
+
+
+def _run_queries():
+    conn = psycopg2.connect(**env.POSTGRES_CONFIG)
+    try:
+        with conn.cursor() as cur:
+            for _ in range(QUERIES_PER_GREENLET):
+                cur.execute('SELECT pg_sleep(%s);', (QUERY_SECONDS,))
+    finally:
+        conn.close()
+
+
+def _benchmark(num_greenlets: int) -> float:
+    pool = gevent.pool.Pool(num_greenlets)
+    start = time.time()
+    for _ in range(num_greenlets):
+        pool.spawn(_run_queries)
+    pool.join(raise_error=True)
+    end = time.time()
+    return num_greenlets * QUERIES_PER_GREENLET / (end - start)
+
+
+def benchmark():
+    for num_greenlets in (1, 4, 16, 64):
+        psycopg2.extensions.set_wait_callback(None)
+        blocking_qps = _benchmark(num_greenlets)
+        green.patch_psycopg2()
+        cooperative_qps = _benchmark(num_greenlets)
+        print(f'{num_greenlets} greenlets:'
+              f' {blocking_qps:.1f} queries/second without the callback,'
+              f' {cooperative_qps:.1f} queries/second with the callback',
+              flush=True)
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,55 @@
+"""
+Compares the time and peak memory of normalizing a 512-slice volume
+slice by slice, as 3D images used to be, against image._normalize().
+
+Encoding and uploading the slices is not included.
+
+Usage:
+    python benchmark_volume.py
+"""
+import time
+import tracemalloc
+
+import numpy
+
+from app import image
+
+VOLUME_SHAPE = (512, 512, 512)
+
+
+def _normalize_slices(arr):
+    # The previous implementation of _create_rgb_image() for each slice
+    slices = []
+    for i in range(arr.shape[0]):
+        normalized = ((arr[i] - arr[i].min()) /
+                      (arr[i].max() - arr[i].min()))
+        slices.append((255 * normalized).astype(numpy.uint8))
+    return slices
+
+
+def _benchmark(name, normalize_fn, arr):
+    tracemalloc.start()
+    start = time.time()
+    normalize_fn(arr)
+    end = time.time()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{name}: {end - start:.2f} seconds,'
+          f' {peak / 1024 ** 2:.0f} MiB peak', flush=True)
+
+
+def benchmark():
+    # CT scans are usually stored as int16
+    arr = numpy.random.randint(-1024, 3072, VOLUME_SHAPE, dtype=numpy.int16)
+    print(f'volume: {VOLUME_SHAPE} {arr.dtype},'
+          f' {arr.nbytes / 1024 ** 2:.0f} MiB', flush=True)
+
+    _benchmark('per slice loop', _normalize_slices, arr)
+    _benchmark('_normalize(per_slice=True)',
+               lambda a: image._normalize(a, per_slice=True), arr)
+    _benchmark('_normalize(per_slice=False)',
+               lambda a: image._normalize(a, per_slice=False), arr)
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -1,17 +1,39 @@
 import argparse
 
-from app import db
+from app import db, storage
 
 
 def init_db():
     db.init_db()
 
 
+def migrate():
+    applied = db.migrate()
+    if applied:
+        for name in applied:
+            print(f'Applied migration {name}')
+    else:
+        print('No migrations to apply')
+
+
+def relayout_filesystem(path: str):
+    store = storage.get_storage_client(storage.clients.FILESYSTEM_PREFIX)
+    moved = store.relayout(path)
+    print(f'Moved {moved} files')
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('command')
+    parser.add_argument('--path', default='',
+                        help='the directory for relayout_filesystem,'
+                             ' relative to FILESYSTEM_STORE_ROOT')
     args = parser.parse_args()
     if args.command == 'init_db':
         init_db()
+    elif args.command == 'migrate':
+        migrate()
+    elif args.command == 'relayout_filesystem':
+        relayout_filesystem(args.path)
     else:
         raise ValueError(f"Command '{args.command} not found")
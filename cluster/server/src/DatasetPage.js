@@ -2,12 +2,19 @@ import React from 'react';
 import {Form, Input, Layout, List, Pagination, Select,} from "antd";
 import {
   countSamples,
+  getImagesForSample,
+  getImageStatus,
   listDatasets,
   listSampleImages,
   listSamples
 } from "./api";
 import SampleCard from "./SampleCard";
 
+// The size of the image copies loaded for the sample cards, in pixels
+const CARD_IMAGE_SIZE = 512;
+// How often the status of images which are still being created is checked, in milliseconds
+const IMAGE_STATUS_POLL_INTERVAL = 3000;
+
 /**
  * The main page of the UI.
  *
@@ -32,6 +39,9 @@ class DatasetPage extends React.Component {
       split: '', // the split input value
     };
 
+    // Incremented to stop the polling of pollImageStatus() once other samples are shown
+    this.pollGeneration = 0;
+
     this.datasetOnChange = this.datasetOnChange.bind(this);
     this.offsetOnChange = this.offsetOnChange.bind(this);
     this.updateSamples = this.updateSamples.bind(this);
@@ -48,6 +58,51 @@ class DatasetPage extends React.Component {
     }
   }
 
+  componentWillUnmount() {
+    this.pollGeneration += 1;
+  }
+
+  /**
+   * Polls the status of the images of the samples which are still being
+   * created, and loads the images of each sample once they are created.
+   */
+  pollImageStatuses(dataset, samples) {
+    this.pollGeneration += 1;
+    const generation = this.pollGeneration;
+    samples.slice(0, 16).forEach((sample, i) => {
+      if (sample.info && sample.info.image && sample.info.image.status === 'CREATING') {
+        this.pollImageStatus(dataset, sample.name, i, generation);
+      }
+    });
+  }
+
+  async pollImageStatus(dataset, sampleName, index, generation) {
+    try {
+      let status = 'CREATING';
+      while (status === 'CREATING') {
+        await new Promise(resolve => setTimeout(resolve, IMAGE_STATUS_POLL_INTERVAL));
+        if (generation !== this.pollGeneration) {
+          return; // Other samples are shown
+        }
+        status = (await getImageStatus(dataset, sampleName)).status;
+      }
+      if (status !== 'CREATED') {
+        return;
+      }
+      const images = await getImagesForSample(dataset, sampleName, 1, 0, CARD_IMAGE_SIZE);
+      if (generation !== this.pollGeneration) {
+        return;
+      }
+      this.setState(state => {
+        const sampleImages = [...state.sampleImages];
+        sampleImages[index] = images[0];
+        return {sampleImages: sampleImages};
+      });
+    } catch (e) {
+      console.log(e); // TODO: Render an error popup(?)
+    }
+  }
+
   async datasetOnChange(dataset) {
     try {
       // TODO: Show a loading icon while these network calls occur?
@@ -58,6 +113,7 @@ class DatasetPage extends React.Component {
       const sampleImages = await listSampleImages({
         dataset: dataset,
         limit: 16,
+        size: CARD_IMAGE_SIZE,
       });
       const count = await countSamples(dataset);
       this.setState({
@@ -72,6 +128,7 @@ class DatasetPage extends React.Component {
         label: '',
         split: '',
       });
+      this.pollImageStatuses(dataset, samples);
     } catch (e) {
       console.log(e); // TODO: Render an error popup(?)
     }
@@ -88,13 +145,17 @@ class DatasetPage extends React.Component {
       split: this.state.split,
     };
     const samples = await listSamples(payload);
-    const sampleImages = await listSampleImages(payload);
+    const sampleImages = await listSampleImages({
+      ...payload,
+      size: CARD_IMAGE_SIZE,
+    });
 
     this.setState({
       samples: samples,
       sampleImages: sampleImages,
       pageOffset: pageOffset,
     });
+    this.pollImageStatuses(payload.dataset, samples);
   }
 
   // This is a time-consuming call to fetch new samples and images
@@ -109,12 +170,16 @@ class DatasetPage extends React.Component {
       split: this.state.split,
     };
     const samples = await listSamples(payload);
-    const sampleImages = await listSampleImages(payload);
+    const sampleImages = await listSampleImages({
+      ...payload,
+      size: CARD_IMAGE_SIZE,
+    });
 
     this.setState({
       samples: samples,
       sampleImages: sampleImages,
     });
+    this.pollImageStatuses(payload.dataset, samples);
   }
 
   render() {
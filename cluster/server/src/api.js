@@ -198,6 +198,8 @@ export async function countSamples(dataset) {
  * @param prefix - sample name prefix to filter by
  * @param label - the training label or target of the sample
  * @param split - the split class of the sample
+ * @param size - if set, smaller copies of the images which are at least
+ *  this many pixels wide or high are listed when they exist
  * @returns {Promise<void>} a list of URLs
  */
 export async function listSampleImages({
@@ -207,6 +209,7 @@ export async function listSampleImages({
                                          prefix = '',
                                          label = '',
                                          split = '',
+                                         size = null,
                                        }) {
   const params = {
     limit: limit,
@@ -214,6 +217,7 @@ export async function listSampleImages({
     prefix: prefix,
     label: label,
     split: split,
+    size: size,
   };
   const response = await wrappedRequest({
     url: `/datasets/${dataset}/samples/images`,
@@ -225,19 +229,37 @@ export async function listSampleImages({
 /**
  * Get signed urls to all images associated to the sample.
  *
+ * @param size - if given, smaller copies of the images at least this many
+ *  pixels wide or high are returned when they exist
  * @returns {Promise<*>} a list of URLs to images of the sample
  */
 export async function getImagesForSample(dataset,
                                          sample,
                                          limit,
-                                         offset) {
+                                         offset,
+                                         size = null) {
   const params = {
     limit: limit,
     offset: offset,
+    size: size,
   };
   const response = await wrappedRequest({
     url: `/datasets/${dataset}/samples/${sample}/images`,
     params: params,
   });
   return response.data['images'];
-}
\ No newline at end of file
+}
+
+/**
+ * Gets the status of the images of the sample, which are created in the
+ * background after the sample is registered.
+ *
+ * @returns {Promise<*>} the 'status' ('CREATING', 'CREATED' or 'FAILED'),
+ *  the 'reason' the creation failed and the 'count' of images
+ */
+export async function getImageStatus(dataset, sample) {
+  const response = await wrappedRequest({
+    url: `/datasets/${dataset}/samples/${sample}/images/status`,
+  });
+  return response.data;
+}